@@ -1,29 +1,25 @@
 from flask import Flask, render_template, request, jsonify, Response
 from flask_cors import CORS
-import threading
 import json
 import time
 from queue import Queue
 
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
-from agent.graph import app as agent_app
+from langchain_core.messages import HumanMessage
+from agent.streaming import stream_agent_events
+from agent.graph import prefill
 from agent.stt import listen_and_convert
-from agent.tts import speak
-from agent.llm import SYSTEM_PROMPT
+from agent.remote_capture import transcribe_upload, MAX_UPLOAD_BYTES
+from agent import metrics
+from agent.warmup import warm_up
+from agent.sessions import (
+    get_conversation_history, get_summary, save_exchange, clear_conversation, get_speech_pipeline,
+    get_audio_stream, stop_speech,
+)
 
 flask_app = Flask(__name__)
+flask_app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
 CORS(flask_app)
 
-# Store conversation histories per session
-conversations = {}
-speech_queues = {}
-
-def get_conversation_history(session_id):
-    """Get or create conversation history for a session"""
-    if session_id not in conversations:
-        conversations[session_id] = [SystemMessage(content=SYSTEM_PROMPT)]
-    return conversations[session_id]
-
 @flask_app.route('/')
 def index():
     """Serve the main UI"""
@@ -55,6 +51,41 @@ def listen():
             'error': str(e)
         }), 500
 
+@flask_app.route('/api/transcribe', methods=['POST'])
+def transcribe():
+    """Transcribe audio recorded in the browser (raw L16 with ?rate=, or WAV)"""
+    try:
+        transcript = transcribe_upload(
+            request.get_data(),
+            request.content_type,
+            request.args.get('rate', type=int)
+        )
+        
+        if transcript:
+            print(f"✅ Transcribed: {transcript}")
+            return jsonify({
+                'success': True,
+                'text': transcript
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'No speech detected'
+            }), 400
+    
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    except Exception as e:
+        print(f"❌ Transcribe error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @flask_app.route('/api/chat', methods=['POST'])
 def chat():
     """Process chat message and return response"""
@@ -75,29 +106,20 @@ def chat():
         # Prepare messages
         messages = conversation_history + [HumanMessage(content=user_input)]
         
-        # Get response from agent
+        # Get response from agent (or the response cache)
         print(f"💬 Processing: {user_input}")
         full_response = ""
         
-        for event in agent_app.stream(
-            {"messages": messages},
-            stream_mode="values"
-        ):
-            if event["messages"]:
-                last_msg = event["messages"][-1]
-                
-                if hasattr(last_msg, 'content') and last_msg.content:
-                    full_response = last_msg.content
+        for event in stream_agent_events(messages, get_summary(session_id)):
+            if event["type"] == "done":
+                full_response = event["full"]
+                if event["cached"]:
+                    print("⚡ Answered from response cache")
         
         print(f"🤖 Response: {full_response}")
         
         # Update conversation history
-        conversation_history.append(HumanMessage(content=user_input))
-        conversation_history.append(AIMessage(content=full_response))
-        
-        # Keep history manageable (last 10 exchanges)
-        if len(conversation_history) > 21:
-            conversations[session_id] = [conversation_history[0]] + conversation_history[-20:]
+        save_exchange(session_id, user_input, full_response)
         
         return jsonify({
             'success': True,
@@ -120,35 +142,43 @@ def chat_stream():
         data = request.json
         user_input = data.get('message')
         session_id = data.get('session_id', 'default')
+        speak_reply = data.get('speak', False)
         
         if not user_input:
             return jsonify({'error': 'No message'}), 400
         
         conversation_history = get_conversation_history(session_id)
         messages = conversation_history + [HumanMessage(content=user_input)]
+        summary = get_summary(session_id)
+        
+        # Speak sentences as they complete instead of after the full reply
+        speech = get_speech_pipeline(session_id) if speak_reply else None
         
         def generate():
             full_response = ""
+            cached = False
             
-            for event in agent_app.stream(
-                {"messages": messages},
-                stream_mode="values"
-            ):
-                if event["messages"]:
-                    last_msg = event["messages"][-1]
-                    if isinstance(last_msg, AIMessage) and last_msg.content:
-                        delta = last_msg.content[len(full_response):]
-                        full_response = last_msg.content
-                        yield f"data: {json.dumps({'delta': delta})}\n\n"
+            with metrics.turn(session_id):
+                for event in stream_agent_events(messages, summary):
+                    if event["type"] == "token":
+                        if speech:
+                            speech.feed(event["text"])
+                        yield f"data: {json.dumps({'delta': event['text']})}\n\n"
+                    elif event["type"] == "tool_call":
+                        yield f"data: {json.dumps({'tool_call': event['name'], 'args': event['args']})}\n\n"
+                    elif event["type"] == "tool_result":
+                        yield f"data: {json.dumps({'tool_result': event['name']})}\n\n"
+                    elif event["type"] == "done":
+                        full_response = event["full"]
+                        cached = event["cached"]
+                
+                if speech:
+                    speech.flush()
             
             # Update history
-            conversation_history.append(HumanMessage(content=user_input))
-            conversation_history.append(AIMessage(content=full_response))
-            
-            if len(conversation_history) > 21:
-                conversations[session_id] = [conversation_history[0]] + conversation_history[-20:]
+            save_exchange(session_id, user_input, full_response)
             
-            yield f"data: {json.dumps({'done': True, 'full': full_response})}\n\n"
+            yield f"data: {json.dumps({'done': True, 'full': full_response, 'cached': cached})}\n\n"
         
         return Response(generate(), mimetype='text/event-stream')
         
@@ -162,6 +192,7 @@ def speak_text():
     try:
         data = request.json
         text = data.get('text')
+        session_id = data.get('session_id', 'default')
         
         if not text:
             return jsonify({
@@ -169,10 +200,8 @@ def speak_text():
                 'error': 'No text provided'
             }), 400
         
-        # Run speak in separate thread to avoid blocking
-        thread = threading.Thread(target=speak, args=(text,))
-        thread.daemon = True
-        thread.start()
+        # Queue behind anything the session is already saying (non-blocking)
+        get_speech_pipeline(session_id).say(text)
         
         return jsonify({
             'success': True,
@@ -186,6 +215,34 @@ def speak_text():
             'error': str(e)
         }), 500
 
+@flask_app.route('/api/audio/stream')
+def audio_stream():
+    """Stream the session's speech as WAV; audio arrives sentence by sentence"""
+    session_id = request.args.get('session_id', 'default')
+    stream = get_audio_stream(session_id)
+    
+    return Response(stream.chunks(), mimetype='audio/wav', headers={'Cache-Control': 'no-cache'})
+
+@flask_app.route('/api/speak/stop', methods=['POST'])
+def stop_speaking():
+    """Stop the session's speech (the browser reconnects its audio stream)"""
+    data = request.json or {}
+    stop_speech(data.get('session_id', 'default'))
+    return jsonify({'success': True})
+
+@flask_app.route('/api/prefill', methods=['POST'])
+def prefill_conversation():
+    """The user started speaking: evaluate the session's conversation so far in the background"""
+    data = request.json or {}
+    session_id = data.get('session_id', 'default')
+    started = prefill(get_conversation_history(session_id), get_summary(session_id))
+    return jsonify({'success': True, 'started': started})
+
+@flask_app.route('/api/metrics')
+def metrics_endpoint():
+    """Per-stage latency histograms and cache counters (Prometheus text format)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @flask_app.route('/api/clear', methods=['POST'])
 def clear_history():
     """Clear conversation history"""
@@ -193,7 +250,7 @@ def clear_history():
         data = request.json
         session_id = data.get('session_id', 'default')
         
-        conversations[session_id] = [SystemMessage(content=SYSTEM_PROMPT)]
+        clear_conversation(session_id)
         
         return jsonify({
             'success': True,
@@ -236,4 +293,8 @@ if __name__ == '__main__':
     print()
     print("=" * 70)
     
+    # Load the model, search clients and Watson connections so the first reply
+    # pays neither the model load nor the handshakes
+    warm_up(speech=True)
+    
     flask_app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -0,0 +1,343 @@
+"""Asyncio serving mode: the same API as app.py as an ASGI application.
+
+Run with:  uvicorn asgi_app:asgi_app --host 0.0.0.0 --port 5000
+
+LLM turns go through the graph's async API (app.astream), so a streaming
+session holds no worker thread while tokens are being generated. Concurrent
+turns are capped by a semaphore and excess requests are rejected instead of
+queueing without bound.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import queue
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+from langchain_core.messages import HumanMessage
+from agent.streaming import astream_agent_events
+from agent.graph import prefill
+from agent.remote_capture import UtteranceStream, transcribe_upload, MAX_UPLOAD_BYTES
+from agent import metrics
+from agent.warmup import warm_up
+from agent.sessions import (
+    get_conversation_history, get_summary, save_exchange, clear_conversation, get_speech_pipeline,
+    get_audio_stream, stop_speech,
+)
+
+# Configuration
+MAX_ACTIVE_TURNS = 64     # LLM turns running at once
+MAX_WAITING_TURNS = 256   # turns allowed to wait for a slot before we answer 503
+
+INDEX_HTML = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "index.html")
+
+_turn_slots = asyncio.Semaphore(MAX_ACTIVE_TURNS)
+_waiting = 0
+
+
+class Busy(Exception):
+    """Raised when the server is at its concurrency limit"""
+
+
+async def _acquire_turn_slot():
+    global _waiting
+    if _waiting >= MAX_WAITING_TURNS:
+        raise Busy()
+    _waiting += 1
+    try:
+        await _turn_slots.acquire()
+    finally:
+        _waiting -= 1
+
+
+def _sse(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def index(request):
+    """Serve the main UI"""
+    return FileResponse(INDEX_HTML)
+
+
+async def listen(request):
+    """Listen to the server microphone and convert to text"""
+    from agent.stt import listen_and_convert
+
+    try:
+        transcript = await run_in_threadpool(listen_and_convert)
+        if transcript:
+            return JSONResponse({'success': True, 'text': transcript})
+        return JSONResponse({'success': False, 'error': 'No speech detected'}, status_code=400)
+    except Exception as e:
+        print(f"❌ Listen error: {e}")
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def _read_limited(request, limit):
+    """The request body, or None as soon as it is known to exceed limit bytes"""
+    declared = request.headers.get('content-length')
+    if declared and declared.isdigit() and int(declared) > limit:
+        return None
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            return None
+    return bytes(body)
+
+
+async def transcribe_audio(request):
+    """Transcribe audio recorded in the browser (raw L16 with ?rate=, or WAV)"""
+    try:
+        body = await _read_limited(request, MAX_UPLOAD_BYTES)
+        if body is None:
+            return JSONResponse({'success': False, 'error': 'Recording too large'}, status_code=413)
+
+        rate = request.query_params.get('rate')
+        transcript = await run_in_threadpool(
+            transcribe_upload, body, request.headers.get('content-type'), int(rate) if rate else None,
+        )
+        if transcript:
+            return JSONResponse({'success': True, 'text': transcript})
+        return JSONResponse({'success': False, 'error': 'No speech detected'}, status_code=400)
+    except ValueError as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+    except Exception as e:
+        print(f"❌ Transcribe error: {e}")
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def listen_ws(websocket):
+    """Endpoint and transcribe one utterance streamed from the browser.
+
+    The client connects with ?rate=<sample rate>, then sends binary int16 PCM
+    chunks (and optionally the text "stop"). The server replies with
+    {"event": "speech"} at onset, {"event": "interim", "text": ...} as the
+    words are recognized, {"event": "processing"} once the utterance ended
+    and finally {"event": "final", "text": ...}.
+    """
+    await websocket.accept()
+    interim = queue.SimpleQueue()  # filled by the recognizer's thread
+
+    def on_result(text, final):
+        if not final:
+            interim.put(text)
+
+    try:
+        stream = UtteranceStream(websocket.query_params.get('rate', 16000), on_result)
+    except Exception as e:
+        await websocket.send_json({'event': 'error', 'error': str(e)})
+        await websocket.close()
+        return
+
+    try:
+        while not stream.finished:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message.get('bytes'):
+                if 'onset' in stream.feed(message['bytes']):
+                    await websocket.send_json({'event': 'speech'})
+                latest = None
+                while not interim.empty():
+                    latest = interim.get()
+                if latest:
+                    await websocket.send_json({'event': 'interim', 'text': latest})
+            elif message.get('text') == 'stop':
+                break
+
+        await websocket.send_json({'event': 'processing'})
+        transcript = await run_in_threadpool(stream.transcribe)
+        await websocket.send_json({'event': 'final', 'text': transcript})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"❌ Listen stream error: {e}")
+        await websocket.send_json({'event': 'error', 'error': str(e)})
+        await websocket.close()
+    finally:
+        stream.close()
+
+
+async def chat(request):
+    """Process chat message and return response"""
+    try:
+        data = await request.json()
+        user_input = data.get('message')
+        session_id = data.get('session_id', 'default')
+
+        if not user_input:
+            return JSONResponse({'success': False, 'error': 'No message provided'}, status_code=400)
+
+        messages = get_conversation_history(session_id) + [HumanMessage(content=user_input)]
+        summary = get_summary(session_id)
+
+        await _acquire_turn_slot()
+        try:
+            full_response = ""
+            async for event in astream_agent_events(messages, summary):
+                if event["type"] == "done":
+                    full_response = event["full"]
+        finally:
+            _turn_slots.release()
+
+        save_exchange(session_id, user_input, full_response)
+        return JSONResponse({'success': True, 'response': full_response})
+
+    except Busy:
+        return JSONResponse({'success': False, 'error': 'Server busy'}, status_code=503)
+    except Exception as e:
+        print(f"❌ Chat error: {e}")
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=500)
+
+
+async def chat_stream(request):
+    """Stream chat response in real-time"""
+    data = await request.json()
+    user_input = data.get('message')
+    session_id = data.get('session_id', 'default')
+    speak_reply = data.get('speak', False)
+
+    if not user_input:
+        return JSONResponse({'error': 'No message'}, status_code=400)
+
+    # Reject up front rather than queueing without bound
+    if _waiting >= MAX_WAITING_TURNS:
+        return JSONResponse({'error': 'Server busy'}, status_code=503)
+
+    messages = get_conversation_history(session_id) + [HumanMessage(content=user_input)]
+    summary = get_summary(session_id)
+    speech = get_speech_pipeline(session_id) if speak_reply else None
+
+    async def generate():
+        full_response = ""
+        cached = False
+        try:
+            await _acquire_turn_slot()
+        except Busy:
+            yield _sse({'error': 'Server busy'})
+            return
+
+        with metrics.turn(session_id):
+            try:
+                async for event in astream_agent_events(messages, summary):
+                    if event["type"] == "token":
+                        if speech:
+                            speech.feed(event["text"])
+                        yield _sse({'delta': event['text']})
+                    elif event["type"] == "tool_call":
+                        yield _sse({'tool_call': event['name'], 'args': event['args']})
+                    elif event["type"] == "tool_result":
+                        yield _sse({'tool_result': event['name']})
+                    elif event["type"] == "done":
+                        full_response = event["full"]
+                        cached = event["cached"]
+            finally:
+                _turn_slots.release()
+
+            if speech:
+                speech.flush()
+
+        save_exchange(session_id, user_input, full_response)
+        yield _sse({'done': True, 'full': full_response, 'cached': cached})
+
+    return StreamingResponse(generate(), media_type='text/event-stream')
+
+
+async def speak_text(request):
+    """Convert text to speech"""
+    data = await request.json()
+    text = data.get('text')
+    session_id = data.get('session_id', 'default')
+
+    if not text:
+        return JSONResponse({'success': False, 'error': 'No text provided'}, status_code=400)
+
+    # Queue behind anything the session is already saying (non-blocking)
+    get_speech_pipeline(session_id).say(text)
+    return JSONResponse({'success': True, 'message': 'Speaking started'})
+
+
+async def audio_stream(request):
+    """Stream the session's speech as WAV; audio arrives sentence by sentence"""
+    stream = get_audio_stream(request.query_params.get('session_id', 'default'))
+    return StreamingResponse(stream.achunks(), media_type='audio/wav', headers={'Cache-Control': 'no-cache'})
+
+
+async def stop_speaking(request):
+    """Stop the session's speech (the browser reconnects its audio stream)"""
+    data = await request.json()
+    stop_speech(data.get('session_id', 'default'))
+    return JSONResponse({'success': True})
+
+
+async def prefill_conversation(request):
+    """The user started speaking: evaluate the session's conversation so far in the background"""
+    data = await request.json()
+    session_id = data.get('session_id', 'default')
+    # Dropped, not queued, while turns are waiting for a slot
+    started = not _waiting and not _turn_slots.locked() and prefill(
+        get_conversation_history(session_id), get_summary(session_id),
+    )
+    return JSONResponse({'success': True, 'started': started})
+
+
+async def metrics_endpoint(request):
+    """Per-stage latency histograms and cache counters (Prometheus text format)"""
+    return PlainTextResponse(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+async def clear_history(request):
+    """Clear conversation history"""
+    data = await request.json()
+    clear_conversation(data.get('session_id', 'default'))
+    return JSONResponse({'success': True, 'message': 'History cleared'})
+
+
+async def set_mode(request):
+    """Set voice/text mode"""
+    data = await request.json()
+    return JSONResponse({'success': True, 'mode': data.get('mode', 'voice')})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Load the model, search clients and Watson connections before the first request needs them
+    warm_up(speech=True)
+    yield
+
+
+asgi_app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/listen', listen, methods=['POST']),
+        Route('/api/transcribe', transcribe_audio, methods=['POST']),
+        WebSocketRoute('/ws/listen', listen_ws),
+        Route('/api/chat', chat, methods=['POST']),
+        Route('/api/chat/stream', chat_stream, methods=['POST']),
+        Route('/api/speak', speak_text, methods=['POST']),
+        Route('/api/speak/stop', stop_speaking, methods=['POST']),
+        Route('/api/audio/stream', audio_stream),
+        Route('/api/prefill', prefill_conversation, methods=['POST']),
+        Route('/api/metrics', metrics_endpoint),
+        Route('/api/clear', clear_history, methods=['POST']),
+        Route('/api/mode', set_mode, methods=['POST']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(asgi_app, host='0.0.0.0', port=5000)
@@ -0,0 +1,218 @@
+import io
+import wave
+from math import gcd
+
+import numpy as np
+
+try:
+    import soundfile as sf
+except (ImportError, OSError):  # soundfile (and libsndfile) are optional
+    sf = None
+
+
+# Native sample rates of the Watson STT model families
+MODEL_RATES = {
+    "Telephony": 8000,
+    "NarrowbandModel": 8000,
+    "BroadbandModel": 16000,
+    "Multimedia": 16000,
+}
+DEFAULT_MODEL_RATE = 16000
+
+HALF_TAPS = 10        # filter half-length, in taps per polyphase branch
+KAISER_BETA = 5.0
+BLOCK_ROWS = 4096     # output samples computed per vectorized block
+
+
+def model_sample_rate(model):
+    """Native sample rate of an STT model, e.g. 8000 for en-IN_Telephony"""
+    for suffix, rate in MODEL_RATES.items():
+        if model.endswith(suffix):
+            return rate
+    return DEFAULT_MODEL_RATE
+
+
+def _lowpass(up, down):
+    """Windowed-sinc low-pass cutting off at the lower of the two Nyquist rates; returns (taps, half length)"""
+    max_rate = max(up, down)
+    half_len = HALF_TAPS * max_rate
+    n = np.arange(-half_len, half_len + 1)
+    return np.sinc(n / max_rate) / max_rate * np.kaiser(len(n), KAISER_BETA), half_len
+
+
+def _polyphase_filter(up, down):
+    """_lowpass split into `up` branches: shape (up, taps_per_branch)"""
+    h, half_len = _lowpass(up, down)
+    h = h * up  # gain `up` undoes zero-stuffing
+
+    taps = -(-len(h) // up)
+    h = np.concatenate([h, np.zeros(taps * up - len(h))])
+    return h.reshape(taps, up).T.astype(np.float32), half_len
+
+
+def _resample_numpy(x, up, down):
+    branches, half_len = _polyphase_filter(up, down)
+    taps = branches.shape[1]
+    n_out = -(-len(x) * up // down)
+
+    # Zero-pad so every gathered index is valid
+    padded = np.concatenate([np.zeros(taps, np.float32), x, np.zeros(taps + 2, np.float32)])
+    offsets = np.arange(taps)
+    out = np.empty(n_out, np.float32)
+
+    for start in range(0, n_out, BLOCK_ROWS):
+        m = np.arange(start, min(start + BLOCK_ROWS, n_out))
+        t = m * down + half_len
+        phase, base = t % up, t // up
+        window = padded[(base[:, None] - offsets[None, :]) + taps]
+        out[start:start + len(m)] = np.einsum("ij,ij->i", branches[phase], window)
+
+    return out
+
+
+_resample_poly = False  # not looked up yet
+
+
+def _scipy_resample_poly():
+    """scipy's resample_poly, or None without scipy (the NumPy fallback is used).
+
+    Imported on first use: scipy.signal takes over a second to load, which
+    text-only startup shouldn't pay.
+    """
+    global _resample_poly
+    if _resample_poly is False:
+        try:
+            from scipy.signal import resample_poly
+        except ImportError:
+            resample_poly = None
+        _resample_poly = resample_poly
+    return _resample_poly
+
+
+def resample_audio(samples, src_rate, dst_rate):
+    """Polyphase-resample int16 samples from src_rate to dst_rate"""
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+
+    g = gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    x = samples.astype(np.float32)
+
+    resample_poly = _scipy_resample_poly()
+    if resample_poly is not None:
+        # The same filter as the NumPy fallback (and StreamResampler); scipy applies the gain
+        y = resample_poly(x, up, down, window=_lowpass(up, down)[0])
+    else:
+        y = _resample_numpy(x, up, down)
+
+    return np.clip(np.round(y), -32768, 32767).astype(np.int16)
+
+
+class StreamResampler:
+    """resample_audio for audio that arrives in pieces: same filter, state kept between calls.
+
+    Each process() returns the output samples that are fully determined by
+    the input so far (the filter looks ahead only a few input samples).
+    Concatenated outputs equal resample_audio's NumPy path exactly, and its
+    scipy path to within 1 LSB (float64 vs float32 rounding).
+    """
+
+    def __init__(self, src_rate, dst_rate):
+        g = gcd(src_rate, dst_rate)
+        self.up, self.down = dst_rate // g, src_rate // g
+        self.passthrough = src_rate == dst_rate
+        if not self.passthrough:
+            self.branches, self.half_len = _polyphase_filter(self.up, self.down)
+            taps = self.branches.shape[1]
+            self._offsets = np.arange(taps)
+            self._history = np.zeros(taps, np.float32)  # input from index _start on
+            self._start = -taps                          # (negative indexes are zeros)
+        self._received = 0
+        self._produced = 0
+
+    def process(self, samples):
+        """Feed int16 samples; returns the int16 output they complete"""
+        self._received += len(samples)
+        if self.passthrough:
+            return samples
+        self._history = np.concatenate([self._history, samples.astype(np.float32)])
+        # Output m depends on input up to (m * down + half_len) // up
+        ready = max(0, (self._received * self.up - 1 - self.half_len) // self.down + 1)
+        return self._emit(ready)
+
+    def flush(self):
+        """Output still owed for the input so far (the filter's tail, read against silence)"""
+        if self.passthrough:
+            return np.zeros(0, np.int16)
+        total = -(-self._received * self.up // self.down)
+        pad = (total * self.down + self.half_len) // self.up + 1 - self._received
+        self._history = np.concatenate([self._history, np.zeros(max(0, pad), np.float32)])
+        return self._emit(total)
+
+    def _emit(self, end):
+        m = np.arange(self._produced, end)
+        if not len(m):
+            return np.zeros(0, np.int16)
+        t = m * self.down + self.half_len
+        phase, base = t % self.up, t // self.up
+        window = self._history[(base[:, None] - self._offsets[None, :]) - self._start]
+        y = np.einsum("ij,ij->i", self.branches[phase], window)
+        self._produced = end
+
+        # Keep only what the next output can still reach
+        keep_from = (end * self.down + self.half_len) // self.up - len(self._offsets) + 1
+        drop = max(0, keep_from - self._start)
+        self._history = self._history[drop:]
+        self._start += drop
+        return np.clip(np.round(y), -32768, 32767).astype(np.int16)
+
+
+def encode_audio(samples, rate, encoding="flac"):
+    """Encode int16 mono samples; returns (bytes, content_type).
+
+    Compressed encodings ("flac", "opus") need soundfile; anything unavailable
+    falls back to raw little-endian L16.
+    """
+    if sf is not None and encoding == "flac":
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, rate, format="FLAC", subtype="PCM_16")
+        return buffer.getvalue(), "audio/flac"
+
+    if sf is not None and encoding == "opus" and "OPUS" in sf.available_subtypes("OGG"):
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, rate, format="OGG", subtype="OPUS")
+        return buffer.getvalue(), "audio/ogg;codecs=opus"
+
+    return samples.astype("<i2").tobytes(), f"audio/l16; rate={rate}; channels=1; endianness=little-endian"
+
+
+def decode_audio(data, content_type, rate=None):
+    """Decode uploaded audio to int16 mono samples; returns (samples, rate).
+
+    Accepts raw little-endian L16 (rate from the argument or the content
+    type's "rate=" parameter), WAV, and anything soundfile can read.
+    """
+    content_type = (content_type or "").lower()
+
+    if content_type.startswith(("audio/l16", "application/octet-stream")):
+        for param in content_type.split(";")[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "rate" and value.isdigit():
+                rate = int(value)
+        if not rate:
+            raise ValueError("raw L16 audio needs a sample rate")
+        usable = len(data) - len(data) % 2
+        return np.frombuffer(data[:usable], dtype="<i2").astype(np.int16), rate
+
+    if content_type.startswith(("audio/wav", "audio/x-wav", "audio/wave")) or data[:4] == b"RIFF":
+        with wave.open(io.BytesIO(data)) as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError("only 16-bit WAV is supported")
+            frames = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+            return frames[::wav.getnchannels()].astype(np.int16), wav.getframerate()
+
+    if sf is not None:
+        samples, rate = sf.read(io.BytesIO(data), dtype="int16", always_2d=True)
+        return samples[:, 0], rate
+
+    raise ValueError(f"unsupported audio type: {content_type or 'unknown'}")
@@ -0,0 +1,138 @@
+"""Per-session synthesized audio, streamed to the browser instead of the server speakers.
+
+A session's SpeechPipeline writes each synthesized sentence into the
+session's AudioStream (its play_fn), in order. The browser holds one
+long-lived GET on the stream and receives a WAV header followed by raw PCM
+as it is produced, which it schedules back to back with Web Audio. Nothing
+touches a sound card on the server, so concurrent sessions never contend
+for an output device.
+"""
+import asyncio
+import queue
+import struct
+import threading
+
+# Configuration
+KEEPALIVE_SECONDS = 15  # an idle stream sends a few samples of silence this often
+MAX_BUFFERED_CHUNKS = 512  # ~45 s of speech at 4 KB chunks; a listener this far behind is dropped
+_STREAMING_SIZE = 0xFFFFFFFF  # WAV size fields for a stream of unknown length
+_KEEPALIVE = bytes(4)         # two silent 16-bit samples
+
+
+def wav_header(rate, channels=1, bits=16):
+    """A WAV header for a stream of unknown length, followed directly by PCM data"""
+    block_align = channels * bits // 8
+    return (
+        b"RIFF" + struct.pack("<I", _STREAMING_SIZE) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, rate, rate * block_align, block_align, bits)
+        + b"data" + struct.pack("<I", _STREAMING_SIZE)
+    )
+
+
+class AudioStream:
+    """Ordered PCM output for one session, delivered to at most one listener.
+
+    A new listener replaces the previous one (a reloaded tab, or a client
+    that reconnects after stopping playback), and the old response ends.
+    Audio written while nobody is listening is dropped, and a listener that
+    falls MAX_BUFFERED_CHUNKS behind is disconnected rather than buffered.
+    """
+
+    def __init__(self, rate=None):
+        if rate is None:
+            from agent.backends import get_synthesizer
+            rate = get_synthesizer().sample_rate
+        self.rate = rate
+        self._deliver = None  # put(item) for the current listener
+        self._lock = threading.Lock()
+
+    def write(self, audio):
+        """Send PCM bytes (or an iterable of chunks) to the listener; SpeechPipeline's play_fn"""
+        if isinstance(audio, (bytes, bytearray)):
+            audio = [audio]
+
+        with self._lock:
+            deliver = self._deliver
+        if deliver is None:
+            print("⚠️ No audio listener; dropping speech")
+            return False
+
+        for chunk in audio:
+            deliver(bytes(chunk))
+        return True
+
+    def reset(self):
+        """End the current listener's stream, discarding audio it hasn't received"""
+        self._attach(None)
+
+    def chunks(self):
+        """Blocking generator for sync servers: WAV header, then PCM as it arrives"""
+        pending = queue.Queue(maxsize=MAX_BUFFERED_CHUNKS)
+        overflowed = threading.Event()
+
+        def deliver(item):
+            try:
+                pending.put_nowait(item)
+            except queue.Full:
+                self._overflow(deliver, overflowed)
+
+        self._attach(deliver)
+        try:
+            yield wav_header(self.rate)
+            while not overflowed.is_set():
+                try:
+                    chunk = pending.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    chunk = _KEEPALIVE  # lets the server notice a client that went away
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self._detach(deliver)
+
+    async def achunks(self):
+        """Async twin of chunks(); waiting holds no thread"""
+        loop = asyncio.get_running_loop()
+        pending = asyncio.Queue(maxsize=MAX_BUFFERED_CHUNKS)
+        overflowed = threading.Event()
+
+        def enqueue(item):
+            try:
+                pending.put_nowait(item)
+            except asyncio.QueueFull:
+                self._overflow(deliver, overflowed)
+
+        def deliver(item):
+            loop.call_soon_threadsafe(enqueue, item)
+
+        self._attach(deliver)
+        try:
+            yield wav_header(self.rate)
+            while not overflowed.is_set():
+                try:
+                    chunk = await asyncio.wait_for(pending.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    chunk = _KEEPALIVE
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self._detach(deliver)
+
+    def _overflow(self, deliver, overflowed):
+        if not overflowed.is_set():
+            print("⚠️ Audio listener fell too far behind; disconnecting it")
+            overflowed.set()
+        self._detach(deliver)
+
+    def _attach(self, deliver):
+        with self._lock:
+            previous, self._deliver = self._deliver, deliver
+        if previous is not None:
+            previous(None)
+
+    def _detach(self, deliver):
+        with self._lock:
+            if self._deliver is deliver:
+                self._deliver = None
+
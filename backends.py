@@ -0,0 +1,653 @@
+import itertools
+import json
+from abc import ABC, abstractmethod
+import queue
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # httpx (with h2) is only needed for TTS_HTTP2
+    httpx = None
+
+import config
+from config import (
+    STT_API_KEY, STT_URL, TTS_API_KEY, TTS_URL, IAM_URL,
+    STT_BACKEND, TTS_BACKEND, WHISPER_MODEL, PIPER_VOICE,
+)
+from agent.audio import model_sample_rate, resample_audio, encode_audio, StreamResampler
+
+# Optional settings; config.py files written before they existed get the defaults
+STT_STREAMING = getattr(config, "STT_STREAMING", True)
+TTS_POOL_SIZE = getattr(config, "TTS_POOL_SIZE", 4)
+TTS_HTTP2 = getattr(config, "TTS_HTTP2", False)
+
+
+# ---- Interfaces ----
+class Recognizer(ABC):
+    """Speech-to-text backend: int16 mono samples in, transcript out"""
+
+    @abstractmethod
+    def recognize(self, samples, rate):
+        """Return the transcript for the audio, or None if nothing was recognized"""
+
+    def warm_up(self):
+        """Prepare connections/models so the first utterance is fast (optional)"""
+
+    def open_stream(self, rate, on_result=None):
+        """Start recognizing an utterance whose audio will arrive in pieces (a RecognitionStream).
+
+        Backends without streaming recognition buffer the audio and run
+        recognize() on it when the stream is finished.
+        """
+        return BufferedRecognitionStream(self, rate, on_result)
+
+
+class RecognitionStream(ABC):
+    """One utterance recognized while it is being captured.
+
+    feed() int16 samples as they arrive, then finish() for the final
+    transcript. Hypotheses are delivered as (text, final) to on_result (called
+    from a background thread) and through the results() generator.
+    """
+
+    def __init__(self, rate, on_result=None):
+        self.rate = rate
+        self._on_result = on_result
+        self._results = queue.Queue()
+
+    @abstractmethod
+    def feed(self, samples):
+        """Add the next int16 samples of the utterance"""
+
+    @abstractmethod
+    def finish(self, timeout=None):
+        """End of speech: return the final transcript, or None if nothing was recognized"""
+
+    def cancel(self):
+        """Abandon the utterance (e.g. nobody spoke)"""
+
+    def results(self):
+        """Yield (text, final) hypotheses as they arrive, until the final one"""
+        while True:
+            hypothesis = self._results.get()
+            if hypothesis is None:
+                return
+            yield hypothesis
+            if hypothesis[1]:
+                return
+
+    def _publish(self, text, final):
+        self._results.put((text, final))
+        if self._on_result is not None:
+            try:
+                self._on_result(text, final)
+            except Exception as e:
+                print(f"⚠️ Transcript callback failed: {e}")
+
+    def _close_results(self):
+        self._results.put(None)
+
+
+class BufferedRecognitionStream(RecognitionStream):
+    """Collects the audio and recognizes it in one request at finish()"""
+
+    def __init__(self, recognizer, rate, on_result=None):
+        super().__init__(rate, on_result)
+        self.recognizer = recognizer
+        self._chunks = []
+
+    def feed(self, samples):
+        self._chunks.append(samples)
+
+    def finish(self, timeout=None):
+        try:
+            if not self._chunks:
+                return None
+            transcript = self.recognizer.recognize(np.concatenate(self._chunks), self.rate)
+            if transcript:
+                self._publish(transcript, True)
+            return transcript
+        finally:
+            self._close_results()
+
+    def cancel(self):
+        self._chunks = []
+        self._close_results()
+
+
+class Synthesizer(ABC):
+    """Text-to-speech backend producing 16-bit mono PCM at `sample_rate`"""
+
+    sample_rate = 22050
+
+    @property
+    def voice_id(self):
+        """Identifies the voice, for caching synthesized audio"""
+        return type(self).__name__
+
+    @abstractmethod
+    def stream(self, text):
+        """Yield PCM chunks (whole int16 samples) as they become available"""
+
+    def synthesize(self, text):
+        """Return the complete PCM for text, or None if nothing was produced"""
+        audio_bytes = b"".join(self.stream(text))
+        return audio_bytes or None
+
+    def warm_up(self):
+        """Prepare connections/models so the first utterance is fast (optional)"""
+
+
+# ---- IBM Watson ----
+class WatsonRecognizer(Recognizer):
+    """IBM Watson Speech to Text (REST recognize)"""
+
+    # KEY CHANGES FOR INDIAN ENGLISH:
+    model = "en-IN_Telephony"  # Indian English model (8 kHz)
+    # Alternative models you can try:
+    # model = "en-IN_BroadbandModel"  # Higher quality for non-telephony (16 kHz)
+    # model = "en-GB_BroadbandModel"  # British English (closer to Indian)
+    encoding = "flac"  # "flac", "opus" or "l16"; falls back to l16 without soundfile
+
+    def __init__(self, streaming=STT_STREAMING):
+        from ibm_watson import SpeechToTextV1
+        from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
+
+        self.authenticator = IAMAuthenticator(STT_API_KEY, url=IAM_URL)
+        self.client = SpeechToTextV1(authenticator=self.authenticator)
+        self.client.set_service_url(STT_URL)
+        self.streaming = streaming
+        self.sockets = WatsonSocketPool(STT_URL, self._auth_headers, self.model)
+
+    def _auth_headers(self):
+        request = {"headers": {}}
+        self.authenticator.authenticate(request)
+        return request["headers"]
+
+    def open_stream(self, rate, on_result=None):
+        if not self.streaming:
+            return super().open_stream(rate, on_result)
+        return WatsonRecognitionStream(self, rate, on_result)
+
+    def warm_up(self):
+        """Open a recognition socket ahead of the first utterance"""
+        if self.streaming:
+            self.sockets.release(self.sockets.acquire())
+
+    def recognize(self, samples, rate):
+        # Upload only what the model uses: resample to its native rate, then compress
+        model_rate = model_sample_rate(self.model)
+        samples = resample_audio(samples, rate, model_rate)
+        audio_bytes, content_type = encode_audio(samples, model_rate, self.encoding)
+        print(f"📦 Uploading {len(audio_bytes)} bytes ({content_type})")
+
+        response = self.client.recognize(
+            audio=audio_bytes,
+            content_type=content_type,
+            model=self.model,
+
+            # Additional helpful parameters:
+            smart_formatting=True,  # Better formatting of numbers, dates, etc.
+            speech_detector_sensitivity=0.5,  # Adjust if too sensitive/not sensitive
+            background_audio_suppression=0.5,  # Reduce background noise
+            inactivity_timeout=5,  # Auto-stop after 5 seconds of silence
+            end_of_phrase_silence_time=0.5  # Faster phrase detection
+        ).get_result()
+
+        print("🔍 Raw STT response:", response)
+
+        # Return None if no speech detected
+        if "results" not in response or len(response["results"]) == 0:
+            return None
+
+        transcript = response["results"][0]["alternatives"][0]["transcript"].strip()
+        return transcript or None
+
+
+class WatsonSocket:
+    """One persistent connection to Watson's WebSocket recognize interface.
+
+    Each utterance is a request on the open connection: a "start" message
+    (answered with {"state": "listening"}), binary audio, then "stop", after
+    which the service sends the last results and {"state": "listening"}
+    again. Reusing the connection skips the TCP, TLS and token round trips.
+    """
+
+    def __init__(self, url, headers):
+        # Imported here so REST-only and local backends never need websockets
+        from websockets.sync.client import connect
+
+        self.connection = connect(url, additional_headers=headers, open_timeout=5, max_size=None)
+        self.broken = False
+
+    def send(self, message):
+        try:
+            self.connection.send(message)
+        except Exception:
+            self.broken = True
+            raise
+
+    def receive(self, timeout=None):
+        """Next JSON message from the service (TimeoutError if none arrives in time)"""
+        try:
+            return json.loads(self.connection.recv(timeout))
+        except TimeoutError:
+            raise
+        except Exception:
+            self.broken = True
+            raise
+
+    def close(self):
+        self.broken = True
+        self.connection.close()
+
+
+class WatsonSocketPool:
+    """Idle recognition sockets kept open between utterances (one per concurrent speaker)"""
+
+    idle_timeout = 25  # Watson drops a connection after 30 s without a request
+
+    def __init__(self, service_url, headers, model):
+        scheme, rest = service_url.split("://", 1)
+        self.url = f"{'wss' if scheme == 'https' else 'ws'}://{rest.rstrip('/')}/v1/recognize?model={model}"
+        self._headers = headers
+        self._idle = []  # (socket, time released)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                socket, released = self._idle.pop()
+                if now - released < self.idle_timeout:
+                    return socket
+                socket.close()
+        return WatsonSocket(self.url, self._headers())
+
+    def release(self, socket):
+        if socket.broken:
+            socket.close()
+            return
+        with self._lock:
+            self._idle.append((socket, time.monotonic()))
+
+
+class WatsonRecognitionStream(RecognitionStream):
+    """An utterance streamed to Watson as it is captured.
+
+    A sender thread connects (or reuses an idle socket), starts the request
+    and forwards the audio, resampled to the model's rate, while a reader
+    thread collects interim and final results. If the socket fails, the
+    buffered utterance is recognized over REST instead.
+    """
+
+    final_timeout = 5.0  # seconds to wait for the last results after "stop"
+
+    def __init__(self, recognizer, rate, on_result=None):
+        super().__init__(rate, on_result)
+        self.recognizer = recognizer
+        self.model_rate = model_sample_rate(recognizer.model)
+        self._resampler = StreamResampler(rate, self.model_rate)
+        self._captured = []
+        self._outgoing = queue.Queue()  # PCM bytes, then None at end of speech
+        self._finals = {}  # result_index -> transcript
+        self._interim = ""
+        self._done = threading.Event()
+        self._error = None
+        self._cancelled = False
+        threading.Thread(target=self._send, name="stt-stream", daemon=True).start()
+
+    def feed(self, samples):
+        self._captured.append(samples)
+        pcm = self._resampler.process(samples)
+        if len(pcm):
+            self._outgoing.put(pcm.astype("<i2").tobytes())
+
+    def finish(self, timeout=None):
+        tail = self._resampler.flush()
+        if len(tail):
+            self._outgoing.put(tail.astype("<i2").tobytes())
+        self._outgoing.put(None)
+
+        try:
+            if not self._captured:
+                return None
+            if not self._done.wait(self.final_timeout if timeout is None else timeout):
+                self._error = self._error or TimeoutError("no final result from Watson")
+            if self._error is not None:
+                print(f"⚠️ Streaming STT failed ({self._error}); recognizing the recording instead")
+                transcript = self.recognizer.recognize(np.concatenate(self._captured), self.rate)
+            else:
+                transcript = self._transcript() or None
+            if transcript:
+                self._publish(transcript, True)
+            return transcript
+        finally:
+            self._close_results()
+
+    def cancel(self):
+        self._cancelled = True
+        self._outgoing.put(None)
+        self._close_results()
+
+    def _transcript(self, interim=""):
+        parts = [self._finals[i] for i in sorted(self._finals)] + [interim]
+        return " ".join(part for part in parts if part)
+
+    def _send(self):
+        pool = self.recognizer.sockets
+        socket = None
+        try:
+            socket = pool.acquire()
+            socket.send(json.dumps({
+                "action": "start",
+                "content-type": f"audio/l16;rate={self.model_rate};endianness=little-endian",
+                "interim_results": True,
+                "smart_formatting": True,
+                "speech_detector_sensitivity": 0.5,
+                "background_audio_suppression": 0.5,
+                "end_of_phrase_silence_time": 0.5,
+                "inactivity_timeout": -1,  # our endpointer decides when the utterance ends
+            }))
+            self._expect_listening(socket)
+
+            reader = threading.Thread(target=self._read, args=(socket,), name="stt-results", daemon=True)
+            reader.start()
+            while True:
+                chunk = self._outgoing.get()
+                if chunk is None:
+                    break
+                socket.send(chunk)
+            socket.send(json.dumps({"action": "stop"}))
+            reader.join(self.final_timeout)
+            if reader.is_alive():
+                raise TimeoutError("no final result from Watson")
+        except Exception as e:
+            self._error = e
+        finally:
+            if socket is not None:
+                if self._error is not None:
+                    socket.close()  # a half-finished request's results would leak into the next one
+                else:
+                    pool.release(socket)
+            self._done.set()  # after release, so the next utterance can reuse the socket
+
+    def _expect_listening(self, socket):
+        while True:
+            message = socket.receive(self.final_timeout)
+            if "error" in message:
+                raise RuntimeError(message["error"])
+            if message.get("state") == "listening":
+                return
+            if "warnings" in message:
+                print(f"⚠️ Watson STT: {message['warnings']}")
+
+    def _read(self, socket):
+        try:
+            while True:
+                message = socket.receive()
+                if "error" in message:
+                    raise RuntimeError(message["error"])
+                if message.get("state") == "listening":
+                    break  # the request is complete
+                self._on_results(message)
+        except Exception as e:
+            self._error = e
+
+    def _on_results(self, message):
+        index = message.get("result_index", 0)
+        for offset, result in enumerate(message.get("results", [])):
+            text = result["alternatives"][0]["transcript"].strip()
+            if result.get("final"):
+                self._finals[index + offset] = text
+                self._interim = ""
+            else:
+                self._interim = text
+            if not self._cancelled:
+                self._publish(self._transcript(self._interim), False)
+
+
+class WatsonSynthesizer(Synthesizer):
+    """IBM Watson Text to Speech, streamed as raw little-endian L16.
+
+    All requests share one keep-alive connection pool (optionally HTTP/2 via
+    httpx), so only the first connection pays the TCP+TLS handshake.
+    """
+
+    sample_rate = 22050
+    voice = "en-US_AllisonV3Voice"
+    chunk_bytes = 4096
+    timeout = (5, 15)  # connect, read
+
+    def __init__(self, pool_size=TTS_POOL_SIZE, http2=TTS_HTTP2):
+        self.pool_size = pool_size
+        self.auth = ("apikey", TTS_API_KEY)
+
+        self.client = None
+        if http2 and httpx is not None:
+            try:
+                self.client = httpx.Client(
+                    http2=True,
+                    auth=self.auth,
+                    limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+                    timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                )
+            except ImportError:  # httpx without the h2 extra
+                pass
+
+        if self.client is not None:
+            self.session = None
+        else:
+            if http2:
+                print("⚠️ TTS_HTTP2 requested but httpx[http2] is not installed; using HTTP/1.1 keep-alive")
+            self.session = requests.Session()
+            self.session.auth = self.auth
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+
+    @property
+    def voice_id(self):
+        return f"watson/{self.voice}"
+
+    def stream(self, text):
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": f"audio/l16;rate={self.sample_rate};endianness=little-endian"
+        }
+        params = {"voice": self.voice}
+        payload = {"text": text}
+
+        print("📡 Requesting audio from TTS API...")
+        if self.client is not None:
+            with self.client.stream("POST", TTS_URL, headers=headers, params=params, json=payload) as response:
+                if response.status_code != 200:
+                    print(f"❌ TTS API Error (Status {response.status_code}):", response.read().decode(errors="replace"))
+                    return
+                yield from _whole_samples(response.iter_bytes(self.chunk_bytes))
+            return
+
+        response = self.session.post(
+            TTS_URL,
+            headers=headers,
+            params=params,
+            json=payload,
+            stream=True,
+            timeout=self.timeout
+        )
+
+        with response:
+            if response.status_code != 200:
+                print(f"❌ TTS API Error (Status {response.status_code}):", response.text)
+                return
+            yield from _whole_samples(response.iter_content(chunk_size=self.chunk_bytes))
+
+    def warm_up(self):
+        """Open pooled connections ahead of time with a cheap voice lookup"""
+        url = f"{TTS_URL.rsplit('/v1/', 1)[0]}/v1/voices/{self.voice}"
+        get = self.client.get if self.client is not None else self.session.get
+
+        def open_connection():
+            try:
+                get(url, timeout=self.timeout[1]).close()
+            except Exception as e:
+                print(f"⚠️ TTS warm-up failed: {e}")
+
+        # Concurrent requests so the pool ends up with several live connections
+        threads = [threading.Thread(target=open_connection) for _ in range(min(2, self.pool_size))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def _whole_samples(chunks):
+    """Re-chunk a byte stream so every chunk holds whole int16 samples"""
+    carry = b""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        chunk = carry + chunk
+        cut = len(chunk) - (len(chunk) % 2)
+        carry = chunk[cut:]
+        if cut:
+            yield chunk[:cut]
+
+
+# ---- Local, in-process engines ----
+class WhisperRecognizer(Recognizer):
+    """CPU Whisper via faster-whisper; no network on the recognition path"""
+
+    sample_rate = 16000
+
+    def __init__(self, model=WHISPER_MODEL):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(model, device="cpu", compute_type="int8")
+
+    def recognize(self, samples, rate):
+        samples = resample_audio(samples, rate, self.sample_rate)
+        segments, _ = self.model.transcribe(
+            samples.astype(np.float32) / 32768.0,
+            language="en",
+            beam_size=1,
+            vad_filter=True,
+        )
+        transcript = " ".join(segment.text.strip() for segment in segments).strip()
+        return transcript or None
+
+
+class PiperSynthesizer(Synthesizer):
+    """Local neural TTS via piper (ONNX voice model)"""
+
+    def __init__(self, voice=PIPER_VOICE):
+        from piper import PiperVoice
+
+        self.voice_path = voice
+        self.voice = PiperVoice.load(voice)
+        self.sample_rate = self.voice.config.sample_rate
+
+    @property
+    def voice_id(self):
+        return f"piper/{self.voice_path}"
+
+    def stream(self, text):
+        if hasattr(self.voice, "synthesize_stream_raw"):
+            # piper-tts < 1.3
+            yield from self.voice.synthesize_stream_raw(text)
+        else:
+            for chunk in self.voice.synthesize(text):
+                yield chunk.audio_int16_bytes
+
+
+# ---- Deterministic fakes (benchmarks, offline development) ----
+class FakeRecognizer(Recognizer):
+    """Returns scripted transcripts in order, after an optional fixed latency"""
+
+    def __init__(self, transcripts=("hello", "what is the capital of france"), latency=0.0):
+        self._transcripts = itertools.cycle(transcripts)
+        self._lock = threading.Lock()
+        self.latency = latency
+
+    def recognize(self, samples, rate):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            return next(self._transcripts)
+
+
+class FakeSynthesizer(Synthesizer):
+    """Deterministic tone whose length scales with the text; optional latency"""
+
+    sample_rate = 16000
+
+    def __init__(self, ms_per_char=15, latency=0.0, chunk_ms=100):
+        self.ms_per_char = ms_per_char
+        self.latency = latency
+        self.chunk_samples = self.sample_rate * chunk_ms // 1000
+
+    def stream(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+
+        n = self.sample_rate * self.ms_per_char * len(text) // 1000
+        t = np.arange(n) / self.sample_rate
+        tone = (3000 * np.sin(2 * np.pi * 220 * t)).astype("<i2")
+
+        for start in range(0, n, self.chunk_samples):
+            yield tone[start:start + self.chunk_samples].tobytes()
+
+
+# ---- Registry ----
+RECOGNIZERS = {
+    "watson": WatsonRecognizer,
+    "local": WhisperRecognizer,
+    "fake": FakeRecognizer,
+}
+
+SYNTHESIZERS = {
+    "watson": WatsonSynthesizer,
+    "local": PiperSynthesizer,
+    "fake": FakeSynthesizer,
+}
+
+_recognizer = None
+_synthesizer = None
+_lock = threading.Lock()
+
+
+def get_recognizer():
+    """The configured recognizer (STT_BACKEND), created on first use"""
+    global _recognizer
+    with _lock:
+        if _recognizer is None:
+            _recognizer = RECOGNIZERS[STT_BACKEND]()
+        return _recognizer
+
+
+def get_synthesizer():
+    """The configured synthesizer (TTS_BACKEND), created on first use"""
+    global _synthesizer
+    with _lock:
+        if _synthesizer is None:
+            _synthesizer = SYNTHESIZERS[TTS_BACKEND]()
+        return _synthesizer
+
+
+def set_recognizer(recognizer):
+    """Replace the active recognizer (e.g. with a FakeRecognizer in benchmarks)"""
+    global _recognizer
+    with _lock:
+        _recognizer = recognizer
+
+
+def set_synthesizer(synthesizer):
+    """Replace the active synthesizer"""
+    global _synthesizer
+    with _lock:
+        _synthesizer = synthesizer
@@ -0,0 +1,332 @@
+"""Offline end-to-end benchmark of voice turns.
+
+    python -m bench.e2e --concurrency 1,4,16 --turns 4
+
+Starts bench.fake_ollama (with a scripted tool call) and bench.fake_watson,
+points the agent's config at them, and replaces the sound card with a WAV
+fixture microphone and a null speaker. Each simulated user then runs the
+real code paths: speak() for a greeting, then per turn listen_and_convert()
+(endpointing + Watson STT) and a spoken /api/chat/stream turn through the
+Flask routes, with the session's /api/audio/stream open like a browser.
+
+Reports per concurrency level: time to first token, time to first audio
+(from the end of the user's speech), turn latency, turns/sec and resident
+memory per session, followed by the per-stage p50/p99 from agent.metrics.
+"""
+import argparse
+import json
+import os
+import queue
+import resource
+import threading
+import time
+
+import numpy as np
+
+from bench.loadtest import percentile, start_server
+
+OLLAMA_PORT = 11437
+WATSON_PORT = 11438
+DEFAULT_TOOL_CALL = ("wikipedia_search", {"query": "Paris"})
+SPEECH_LEVEL = 1000  # fixture samples louder than this count as speech
+
+
+def rss_mb():
+    """Current resident set size (peak where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class FixtureMicrophone:
+    """Microphone stand-in that plays a recorded utterance, then silence.
+
+    speech_ended is when the last loud sample was delivered: the moment the
+    user stopped talking, which the latencies are measured from.
+    """
+
+    opened = threading.local()  # the calling thread's latest microphone
+
+    def __init__(self, samples, frame_samples, frame_seconds, realtime=False):
+        self.samples = samples
+        self.frame_samples = frame_samples
+        self.frame_seconds = frame_seconds
+        self.realtime = realtime
+        self.position = 0
+        loud = np.flatnonzero(np.abs(samples.astype(np.int32)) > SPEECH_LEVEL)
+        self.speech_end = int(loud[-1]) + 1 if len(loud) else 0
+        self.speech_ended = None
+        FixtureMicrophone.opened.mic = self
+
+    def read(self, timeout=None):
+        frame = self.samples[self.position:self.position + self.frame_samples]
+        self.position += self.frame_samples
+        if self.speech_ended is None and self.position >= self.speech_end:
+            self.speech_ended = time.perf_counter()
+        if len(frame) < self.frame_samples:
+            frame = np.concatenate([frame, np.zeros(self.frame_samples - len(frame), dtype=np.int16)])
+        if self.realtime:
+            time.sleep(self.frame_seconds)
+        return frame
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullOutput:
+    """Speaker stand-in: consumes audio and notes when the first chunk arrived"""
+
+    first_audio = threading.local()
+
+    def play(self, audio, stop=None):
+        if isinstance(audio, (bytes, bytearray)):
+            audio = [audio]
+        for _ in audio:
+            if getattr(NullOutput.first_audio, "at", None) is None:
+                NullOutput.first_audio.at = time.perf_counter()
+            if stop is not None and stop.is_set():
+                return False
+        return True
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def install_offline_tools():
+    """Canned replacements for the network-backed tools, under the same names"""
+    from langchain_core.tools import tool
+    from agent.tools import register_tool
+
+    @register_tool
+    @tool
+    def web_search(query: str) -> str:
+        """Search the internet for current information. Use for recent events, news, or real-time data."""
+        return f"Results for {query}: nothing new happened today."
+
+    @register_tool
+    @tool
+    def wikipedia_search(query: str) -> str:
+        """Search Wikipedia for factual/historical info. Use for established facts, not current events."""
+        return f"{query} is the capital and largest city of France, founded in the 3rd century BC."
+
+
+class AudioListener:
+    """Holds a session's /api/audio/stream open, like the browser does"""
+
+    def __init__(self, client, session_id):
+        self.arrivals = queue.Queue()
+        response = client.get(f"/api/audio/stream?session_id={session_id}", buffered=False)
+        self._chunks = iter(response.response)
+        next(self._chunks)  # WAV header: the server is now streaming to us
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        for chunk in self._chunks:
+            if chunk.strip(b"\0"):  # skip keepalive silence
+                self.arrivals.put(time.perf_counter())
+
+    def first_arrival(self):
+        """When the first audio since the last call arrived (None if none did)"""
+        first = None
+        while True:
+            try:
+                arrived = self.arrivals.get_nowait()
+            except queue.Empty:
+                return first
+            first = arrived if first is None else first
+
+
+def run_user(client, user_id, turns, speak, listen_and_convert, results):
+    # The agent can only be imported once main() has configured the environment
+    from agent.sessions import get_speech_pipeline
+
+    session_id = f"e2e-{user_id}-{time.monotonic_ns()}"
+    listener = AudioListener(client, session_id)
+
+    # Greeting through speak() and the null speaker
+    NullOutput.first_audio.at = None
+    started = time.perf_counter()
+    speak("Hello! How can I help you today?")
+    if NullOutput.first_audio.at is not None:
+        results["speak_ttfa"].append(NullOutput.first_audio.at - started)
+
+    for _ in range(turns):
+        try:
+            # The browser asks for a prefill as it starts capturing
+            client.post("/api/prefill", json={"session_id": session_id})
+            transcript = listen_and_convert()
+            if not transcript:
+                raise RuntimeError("no transcript")
+            # Timed from the end of speech, as the user experiences it
+            heard = FixtureMicrophone.opened.mic.speech_ended
+            listener.first_arrival()  # discard anything older
+
+            ttft = None
+            response = client.post(
+                "/api/chat/stream",
+                json={"message": transcript, "session_id": session_id, "speak": True},
+                buffered=False,
+            )
+            for chunk in response.response:
+                for line in chunk.decode().splitlines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[6:])
+                    if "error" in event:
+                        raise RuntimeError(event["error"])
+                    if ttft is None and event.get("delta"):
+                        ttft = time.perf_counter() - heard
+            turn_done = time.perf_counter() - heard
+
+            # Let the whole reply play out, so the next turn only sees its own audio
+            get_speech_pipeline(session_id).drain(timeout=30)
+            time.sleep(0.05)  # the listener thread is a hop behind the pipeline
+            first_audio = listener.first_arrival()
+            results["ttft"].append(ttft)
+            results["latency"].append(turn_done)
+            if first_audio is not None:
+                results["ttfa"].append(first_audio - heard)
+        except Exception as e:
+            results["errors"].append(e)  # list.append is atomic across threads; += on an int isn't
+            print(f"  ❌ {e}")
+
+
+def run_level(client, concurrency, turns, speak, listen_and_convert):
+    results = {"ttft": [], "ttfa": [], "latency": [], "speak_ttfa": [], "errors": []}
+    memory_before = rss_mb()
+
+    threads = [
+        threading.Thread(target=run_user, args=(client, i, turns, speak, listen_and_convert, results))
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "turns": len(results["latency"]),
+        "errors": len(results["errors"]),
+        "turns_per_sec": len(results["latency"]) / elapsed if elapsed else 0.0,
+        "ttft_p50": percentile([t for t in results["ttft"] if t is not None], 50),
+        "ttft_p99": percentile([t for t in results["ttft"] if t is not None], 99),
+        "ttfa_p50": percentile(results["ttfa"], 50),
+        "ttfa_p99": percentile(results["ttfa"], 99),
+        "latency_p50": percentile(results["latency"], 50),
+        "latency_p99": percentile(results["latency"], 99),
+        "speak_ttfa_p50": percentile(results["speak_ttfa"], 50),
+        "mb_per_session": max(0.0, rss_mb() - memory_before) / concurrency,
+    }
+
+
+def print_report(results):
+    header = (
+        f"{'conc':>5} {'turns':>6} {'err':>4} {'turns/s':>8} {'ttft p50':>9} {'ttft p99':>9} "
+        f"{'ttfa p50':>9} {'ttfa p99':>9} {'lat p50':>8} {'lat p99':>8} {'speak':>7} {'MB/sess':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} {r['turns']:>6} {r['errors']:>4} {r['turns_per_sec']:>8.2f} "
+            f"{r['ttft_p50'] * 1000:>7.0f}ms {r['ttft_p99'] * 1000:>7.0f}ms "
+            f"{r['ttfa_p50'] * 1000:>7.0f}ms {r['ttfa_p99'] * 1000:>7.0f}ms "
+            f"{r['latency_p50']:>7.2f}s {r['latency_p99']:>7.2f}s "
+            f"{r['speak_ttfa_p50'] * 1000:>5.0f}ms {r['mb_per_session']:>8.2f}"
+        )
+
+
+def print_stages(snapshot):
+    """Per-stage p50/p99 as recorded by agent.metrics (bucket upper bounds)"""
+    print(f"\n{'stage':<28} {'count':>6} {'p50 <=':>8} {'p99 <=':>8}")
+    for (stage, labels), (count, p50, p99) in sorted(snapshot.items()):
+        name = stage + "".join(f" {k}={v}" for k, v in labels)
+        print(f"{name:<28} {count:>6} {p50 * 1000:>6.0f}ms {p99 * 1000:>6.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--turns", type=int, default=4, help="turns per simulated user")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--stt", choices=["watson", "fake"], default="watson",
+                        help="watson: the real client against bench.fake_watson (needs ibm-watson)")
+    parser.add_argument("--tts", choices=["watson", "fake"], default="watson")
+    parser.add_argument("--utterance-wav", help="16-bit WAV the fake microphone plays each turn")
+    parser.add_argument("--tts-wav", help="16-bit WAV the fake TTS service replays")
+    parser.add_argument("--realtime-mic", action="store_true", help="deliver microphone frames at real speed")
+    parser.add_argument("--caches", action="store_true",
+                        help="keep the response and audio caches (every turn repeats the same reply)")
+    args = parser.parse_args()
+
+    from bench.fake_ollama import create_app as create_ollama
+    from bench.fake_watson import create_app as create_watson, service_env, read_wav, utterance, DEFAULT_TRANSCRIPTS
+
+    start_server(create_ollama(args.tokens_per_sec, tool_calls=[DEFAULT_TOOL_CALL]), OLLAMA_PORT)
+    start_server(create_watson(tts_wav=args.tts_wav), WATSON_PORT)
+
+    # Must be set before the agent (and its config) is imported
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{OLLAMA_PORT}"
+    os.environ.update(service_env(WATSON_PORT))
+    os.environ["STT_BACKEND"] = args.stt
+    os.environ["TTS_BACKEND"] = args.tts
+
+    from agent import backends, metrics, streaming, stt, tts
+    from agent.audio import resample_audio
+    from agent.tts_cache import AudioCache
+    from agent.vad import FRAME_MS
+
+    if args.utterance_wav:
+        samples, rate = read_wav(args.utterance_wav)
+    else:
+        rate = stt.CAPTURE_RATE
+        samples = utterance(rate)
+    samples = resample_audio(samples, rate, stt.CAPTURE_RATE)
+    frame_samples = int(stt.CAPTURE_RATE * FRAME_MS / 1000)
+
+    if args.stt == "fake":
+        backends.set_recognizer(backends.FakeRecognizer(DEFAULT_TRANSCRIPTS))
+    stt.set_microphone(lambda: FixtureMicrophone(samples, frame_samples, FRAME_MS / 1000, args.realtime_mic))
+    tts.set_audio_output(NullOutput)
+    install_offline_tools()
+
+    if not args.caches:
+        streaming.RESPONSE_CACHE_ENABLED = False
+        tts.audio_cache = AudioCache(max_bytes=0, disk_dir=None)
+
+    from app import flask_app
+
+    client = flask_app.test_client()
+    metrics.registry.reset()
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = []
+    for concurrency in levels:
+        print(f"▶️ {concurrency} concurrent users...")
+        results.append(run_level(client, concurrency, args.turns, tts.speak, stt.listen_and_convert))
+
+    print()
+    print_report(results)
+    print_stages(metrics.registry.snapshot())
+
+
+if __name__ == "__main__":
+    main()
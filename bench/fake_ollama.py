@@ -0,0 +1,122 @@
+"""A local stand-in for the Ollama chat API, streaming tokens at a fixed rate.
+
+Run standalone:  python -m bench.fake_ollama --port 11435 --tokens-per-sec 40
+Point the agent at it with OLLAMA_HOST=http://127.0.0.1:11435
+
+With a tool script (--tool-call wikipedia_search='{"query": "Paris"}'), a
+request that has tools bound and ends with a user message is answered with
+those tool calls; the follow-up request carrying their results gets the reply.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+DEFAULT_REPLY = (
+    "Paris is the capital of France. It sits on the Seine in the north of the country. "
+    "It is known for the Eiffel Tower, the Louvre and its cafes."
+)
+
+
+def create_app(tokens_per_sec=40.0, reply=DEFAULT_REPLY, prompt_eval_ms=20.0, prompt_tokens_per_sec=500.0,
+               tool_calls=()):
+    """Build the fake server; each reply word is streamed as one token.
+
+    Time to first token is prompt_eval_ms plus the prompt (messages and tool
+    schemas, ~4 chars per token) evaluated at prompt_tokens_per_sec.
+    tool_calls is a script of (name, args) pairs requested before replying,
+    when those tools are bound.
+    """
+    words = reply.split(" ")
+    delay = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+
+    def frame(body, content, done=False, **extra):
+        return json.dumps({
+            "model": body.get("model", "fake"),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content, **extra},
+            "done": done,
+        }) + "\n"
+
+    async def chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        prompt_tokens = (len(json.dumps(messages)) + len(json.dumps(body.get("tools") or []))) // 4
+        eval_ms = prompt_eval_ms + (prompt_tokens / prompt_tokens_per_sec * 1000 if prompt_tokens_per_sec > 0 else 0.0)
+
+        calls = _scripted_calls(body, tool_calls)
+        limit = (body.get("options") or {}).get("num_predict")
+        reply_words = words[:limit] if limit and limit > 0 else words
+
+        async def generate():
+            await asyncio.sleep(eval_ms / 1000)
+            if calls:
+                yield frame(body, "", tool_calls=calls)
+            else:
+                for i, word in enumerate(reply_words):
+                    yield frame(body, word if i == len(reply_words) - 1 else word + " ")
+                    await asyncio.sleep(delay)
+
+            final = json.loads(frame(body, "", done=True))
+            final.update(
+                done_reason="stop",
+                prompt_eval_count=prompt_tokens,
+                prompt_eval_duration=int(eval_ms * 1e6),
+                eval_count=len(calls) if calls else len(reply_words),
+                eval_duration=0 if calls else int(len(reply_words) * delay * 1e9),
+            )
+            yield json.dumps(final) + "\n"
+
+        if body.get("stream", True):
+            return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+        chunks = [json.loads(line) async for line in generate()]
+        result = chunks[-1]
+        result["message"]["content"] = "".join(c["message"]["content"] for c in chunks)
+        if calls:
+            result["message"]["tool_calls"] = calls
+        return JSONResponse(result)
+
+    async def tags(request):
+        return JSONResponse({"models": [{"name": "llama3.2:3b", "model": "llama3.2:3b"}]})
+
+    return Starlette(routes=[
+        Route("/api/chat", chat, methods=["POST"]),
+        Route("/api/tags", tags),
+    ])
+
+
+def _scripted_calls(body, script):
+    """The scripted tool calls for this request, if it starts a tool round"""
+    messages = body.get("messages") or []
+    bound = {t.get("function", {}).get("name") for t in body.get("tools") or []}
+    if not script or not messages or messages[-1].get("role") != "user":
+        return []
+    return [{"function": {"name": name, "arguments": args}} for name, args in script if name in bound]
+
+
+def parse_tool_call(spec):
+    """'name={"arg": ...}' (or just 'name') from the command line"""
+    name, _, args = spec.partition("=")
+    return name, json.loads(args) if args else {}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--prompt-tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--tool-call", action="append", default=[], type=parse_tool_call,
+                        help='scripted tool call, e.g. wikipedia_search=\'{"query": "Paris"}\' (repeatable)')
+    args = parser.parse_args()
+
+    app = create_app(args.tokens_per_sec, prompt_tokens_per_sec=args.prompt_tokens_per_sec,
+                     tool_calls=args.tool_call)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
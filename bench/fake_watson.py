@@ -0,0 +1,203 @@
+"""Local stand-ins for IBM Watson Speech to Text, Text to Speech and IAM.
+
+Run standalone:  python -m bench.fake_watson --port 11436
+Point the agent at it with
+    IAM_URL=http://127.0.0.1:11436
+    STT_URL=http://127.0.0.1:11436/stt
+    TTS_URL=http://127.0.0.1:11436/tts/v1/synthesize
+
+Recognition answers with scripted transcripts in order, over REST or the
+WebSocket protocol (start / binary audio / stop, with interim results that
+reveal the transcript as audio arrives). Synthesis streams
+L16 audio replayed from a WAV fixture (or a tone when none is given), about
+as long as the text would take to say, after a configurable first-byte delay.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+import wave
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+from agent.audio import resample_audio
+
+DEFAULT_TRANSCRIPTS = (
+    "what is the capital of france",
+    "tell me about the history of paris",
+    "thanks that was helpful",
+)
+CHUNK_MS = 100
+WORDS_PER_SECOND = 2.5  # how fast interim results reveal the scripted transcript
+
+
+def read_wav(path):
+    """int16 mono samples and rate of a 16-bit WAV fixture"""
+    with wave.open(path) as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit WAV is supported")
+        frames = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+        return frames[::wav.getnchannels()].astype(np.int16), wav.getframerate()
+
+
+def tone(seconds, rate, freq=220.0, level=3000):
+    t = np.arange(int(seconds * rate)) / rate
+    return (level * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+def utterance(rate, speech=1.2, lead=0.3, trail=1.0):
+    """A synthetic user utterance: quiet, a voiced burst, then trailing silence"""
+    rng = np.random.default_rng(0)
+    quiet = lambda seconds: rng.integers(-30, 30, int(seconds * rate)).astype(np.int16)
+    burst = tone(speech, rate, freq=180.0, level=6000)
+    return np.concatenate([quiet(lead), burst, quiet(trail)])
+
+
+def _rate_param(accept, default):
+    for param in accept.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key == "rate" and value.isdigit():
+            return int(value)
+    return default
+
+
+def create_app(transcripts=DEFAULT_TRANSCRIPTS, recognize_ms=300.0, tts_wav=None,
+               tts_first_byte_ms=150.0, tts_ms_per_char=60.0, tts_speed=4.0, final_ms=80.0):
+    """Build the fake services.
+
+    recognize_ms: latency of one recognition request
+    final_ms: delay between "stop" and the final result on the WebSocket
+    tts_wav: WAV fixture replayed (looped) as synthesized speech
+    tts_first_byte_ms: delay before the first audio chunk
+    tts_ms_per_char: audio produced per character of text
+    tts_speed: how many times faster than real time audio is streamed
+    """
+    script = itertools.cycle(transcripts)
+    fixture = read_wav(tts_wav) if tts_wav else None
+
+    async def token(request: Request):
+        now = int(time.time())
+        return JSONResponse({
+            "access_token": "fake-token", "refresh_token": "fake-refresh",
+            "token_type": "Bearer", "expires_in": 3600, "expiration": now + 3600,
+        })
+
+    async def recognize(request: Request):
+        await request.body()
+        await asyncio.sleep(recognize_ms / 1000)
+        return JSONResponse({
+            "result_index": 0,
+            "results": [{"final": True, "alternatives": [{"transcript": next(script), "confidence": 0.95}]}],
+        })
+
+    async def recognize_socket(websocket):
+        """Watson's WebSocket recognize: any number of start ... stop requests per connection"""
+        await websocket.accept()
+        rate, received, words, revealed = 16000, 0, [], 0
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes") is not None:
+                    received += len(message["bytes"]) // 2
+                    count = min(len(words), int(received / rate * WORDS_PER_SECOND))
+                    if count > revealed:
+                        revealed = count
+                        await websocket.send_json(_results(" ".join(words[:count]), final=False))
+                    continue
+
+                request = json.loads(message["text"]) if message.get("text") else {}
+                action = request.get("action")
+                if action == "start":
+                    rate = _rate_param(request.get("content-type", ""), 16000)
+                    received, words, revealed = 0, next(script).split(), 0
+                    await websocket.send_json({"state": "listening"})
+                elif action == "stop":
+                    await asyncio.sleep(final_ms / 1000)
+                    if received:
+                        await websocket.send_json(_results(" ".join(words), final=True))
+                    await websocket.send_json({"state": "listening"})
+                else:
+                    await websocket.send_json({"error": f"unknown message {message.get('text')!r}"})
+        except WebSocketDisconnect:
+            pass
+
+    def speech_for(text, rate):
+        seconds = max(0.2, len(text) * tts_ms_per_char / 1000)
+        if fixture is None:
+            return tone(seconds, rate)
+        samples = resample_audio(fixture[0], fixture[1], rate)
+        repeats = int(seconds * rate) // max(1, len(samples)) + 1
+        return np.tile(samples, repeats)[:int(seconds * rate)]
+
+    async def synthesize(request: Request):
+        body = await request.json()
+        rate = _rate_param(request.headers.get("accept", ""), 22050)
+        audio = speech_for(body.get("text", ""), rate).astype("<i2").tobytes()
+        chunk_bytes = 2 * rate * CHUNK_MS // 1000
+        pause = CHUNK_MS / 1000 / tts_speed if tts_speed > 0 else 0.0
+
+        async def generate():
+            await asyncio.sleep(tts_first_byte_ms / 1000)
+            for start in range(0, len(audio), chunk_bytes):
+                yield audio[start:start + chunk_bytes]
+                await asyncio.sleep(pause)
+
+        return StreamingResponse(generate(), media_type=f"audio/l16;rate={rate}")
+
+    async def voice(request: Request):
+        return JSONResponse({"name": request.path_params["voice"], "language": "en-US"})
+
+    return Starlette(routes=[
+        Route("/identity/token", token, methods=["POST"]),
+        Route("/stt/v1/recognize", recognize, methods=["POST"]),
+        WebSocketRoute("/stt/v1/recognize", recognize_socket),
+        Route("/tts/v1/synthesize", synthesize, methods=["POST"]),
+        Route("/tts/v1/voices/{voice}", voice),
+    ])
+
+
+def _results(transcript, final):
+    return {
+        "result_index": 0,
+        "results": [{"final": final, "alternatives": [{"transcript": transcript, "confidence": 0.95}]}],
+    }
+
+
+def service_env(port, host="127.0.0.1"):
+    """Environment that points the agent's config at a fake_watson server"""
+    base = f"http://{host}:{port}"
+    return {
+        "IAM_URL": base,
+        "STT_URL": f"{base}/stt",
+        "TTS_URL": f"{base}/tts/v1/synthesize",
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11436)
+    parser.add_argument("--transcript", action="append", help="scripted transcript (repeatable)")
+    parser.add_argument("--recognize-ms", type=float, default=300.0)
+    parser.add_argument("--tts-wav", help="16-bit WAV replayed as synthesized speech")
+    parser.add_argument("--tts-first-byte-ms", type=float, default=150.0)
+    parser.add_argument("--final-ms", type=float, default=80.0, help='WebSocket delay from "stop" to the final result')
+    args = parser.parse_args()
+
+    app = create_app(
+        transcripts=args.transcript or DEFAULT_TRANSCRIPTS,
+        recognize_ms=args.recognize_ms,
+        tts_wav=args.tts_wav,
+        tts_first_byte_ms=args.tts_first_byte_ms,
+        final_ms=args.final_ms,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,158 @@
+"""Load test for the ASGI server against a local fake LLM.
+
+    python -m bench.loadtest --concurrency 1,8,32,128 --turns 256
+
+Starts bench.fake_ollama and asgi_app in-process (or targets --url), then
+runs concurrent streaming sessions against /api/chat/stream and reports
+throughput plus p50/p99 time-to-first-token and turn latency per level.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import threading
+import time
+
+import httpx
+import uvicorn
+
+OLLAMA_PORT = 11435
+SERVER_PORT = 8765
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def start_server(app, port):
+    """Run a uvicorn server on a background thread and wait until it accepts requests"""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_turn(client, url, session_id, message):
+    """One streamed turn; returns (ttft, total) in seconds"""
+    started = time.perf_counter()
+    ttft = None
+
+    async with client.stream(
+        "POST", f"{url}/api/chat/stream",
+        json={"message": message, "session_id": session_id},
+    ) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if "error" in event:
+                raise RuntimeError(event["error"])
+            if ttft is None and event.get("delta"):
+                ttft = time.perf_counter() - started
+            if event.get("done"):
+                break
+
+    return ttft, time.perf_counter() - started
+
+
+async def run_level(url, concurrency, turns, message):
+    """Run `turns` turns with `concurrency` sessions in flight at once"""
+    ttfts, totals, errors = [], [], 0
+    queue = asyncio.Queue()
+    for i in range(turns):
+        queue.put_nowait(i)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        async def worker(worker_id):
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                try:
+                    ttft, total = await run_turn(client, url, f"load-{concurrency}-{worker_id}", message)
+                    if ttft is not None:
+                        ttfts.append(ttft)
+                    totals.append(total)
+                except Exception as e:
+                    errors += 1
+                    print(f"  ❌ {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "turns": len(totals),
+        "errors": errors,
+        "turns_per_sec": len(totals) / elapsed if elapsed else 0.0,
+        "ttft_p50": percentile(ttfts, 50),
+        "ttft_p99": percentile(ttfts, 99),
+        "latency_p50": percentile(totals, 50),
+        "latency_p99": percentile(totals, 99),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def print_report(results):
+    header = f"{'conc':>5} {'turns':>6} {'err':>4} {'turns/s':>8} {'ttft p50':>9} {'ttft p99':>9} {'lat p50':>8} {'lat p99':>8} {'rss MB':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} {r['turns']:>6} {r['errors']:>4} {r['turns_per_sec']:>8.1f} "
+            f"{r['ttft_p50'] * 1000:>7.0f}ms {r['ttft_p99'] * 1000:>7.0f}ms "
+            f"{r['latency_p50']:>7.2f}s {r['latency_p99']:>7.2f}s {r['max_rss_mb']:>7.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="test an already running server instead of starting one")
+    parser.add_argument("--concurrency", default="1,8,32,128")
+    parser.add_argument("--turns", type=int, default=128, help="turns per concurrency level")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--message", default="What is the capital of France?")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="let repeated messages hit the response cache (in-process server only)")
+    args = parser.parse_args()
+
+    url = args.url
+    if url is None:
+        from bench.fake_ollama import create_app
+
+        start_server(create_app(args.tokens_per_sec), OLLAMA_PORT)
+        # Must be set before the agent (and its Ollama client) is imported
+        os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{OLLAMA_PORT}"
+
+        from asgi_app import asgi_app
+        from agent import streaming
+
+        # Every turn asks the same question, so the cache would skip the LLM entirely
+        streaming.RESPONSE_CACHE_ENABLED = args.response_cache
+
+        start_server(asgi_app, SERVER_PORT)
+        url = f"http://127.0.0.1:{SERVER_PORT}"
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    results = []
+    for concurrency in levels:
+        print(f"▶️ {concurrency} concurrent sessions...")
+        results.append(asyncio.run(run_level(url, concurrency, args.turns, args.message)))
+
+    print()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
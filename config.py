@@ -1,8 +1,39 @@
+import os
+
+# Service URLs can be overridden from the environment (bench/ points them at local stand-ins)
+
 # Speech to Text
 STT_API_KEY = "6-O6cWPr6tndJWWU7onOToKn6McP8CTafoYVBJ1gFqE2"
-STT_URL = "https://api.au-syd.speech-to-text.watson.cloud.ibm.com/instances/c8a58e51-5be8-4d47-869f-fd688778593d"
+STT_URL = os.environ.get("STT_URL", "https://api.au-syd.speech-to-text.watson.cloud.ibm.com/instances/c8a58e51-5be8-4d47-869f-fd688778593d")
 
 # Text to Speech
 TTS_API_KEY = "1ZpmMflSDl34lvP0_P4sHT0Wfyc_yq_9oWmMOk05xsds"
-TTS_URL = "https://api.eu-gb.text-to-speech.watson.cloud.ibm.com/instances/f05f9467-9656-479c-b467-a8c2548dc648/v1/synthesize"
+TTS_URL = os.environ.get("TTS_URL", "https://api.eu-gb.text-to-speech.watson.cloud.ibm.com/instances/f05f9467-9656-479c-b467-a8c2548dc648/v1/synthesize")
+
+# IBM Cloud IAM token service (None = the public endpoint)
+IAM_URL = os.environ.get("IAM_URL")
+
+# Speech backends: "watson" (IBM Cloud), "local" (in-process) or "fake" (benchmarks)
+STT_BACKEND = os.environ.get("STT_BACKEND", "watson")
+TTS_BACKEND = os.environ.get("TTS_BACKEND", "watson")
+
+# Recognize Watson STT over a persistent WebSocket while the user is still speaking
+# (interim transcripts; the final one is ready right after they stop). False = REST upload
+STT_STREAMING = True
+
+# Watson TTS connection pool (keep-alive; HTTP/2 needs `pip install httpx[http2]`)
+TTS_POOL_SIZE = 4
+TTS_HTTP2 = False
+
+# On-disk tier of the synthesized-audio cache (None = memory only)
+TTS_CACHE_DIR = ".tts_cache"
+
+# Answer repeated standalone questions from a similarity cache instead of the agent
+RESPONSE_CACHE_ENABLED = True
+
+# Append every latency span to this JSONL file (None = histograms only, see /api/metrics)
+METRICS_TRACE_FILE = None
 
+# Local engines, used when a backend is set to "local"
+WHISPER_MODEL = "base.en"  # faster-whisper model name or path
+PIPER_VOICE = "en_US-lessac-medium.onnx"  # piper voice model path
@@ -1,43 +1,324 @@
-from typing import TypedDict
+import asyncio
+import contextlib
+import queue
+import re
+import threading
+import time
+from typing import TypedDict, NotRequired
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, message_chunk_to_message
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
 
-from agent.llm import llm, SYSTEM_PROMPT
-from agent.tools import tools
+from agent.llm import (
+    llm, prefill_llm, log_timings, SYSTEM_PROMPT, SPECULATIVE_PREFILL, PREFILL_WORKERS, OLLAMA_PARALLEL,
+)
+from agent.tools import get_tools
+from agent.tool_executor import execute_tool_calls, TURN_DEADLINE, CANCEL_POLL
+from agent.tokens import estimate_tokens, message_tokens, trim_to_budget, PROMPT_BUDGET
+from agent.memory import summary_message
+from agent import metrics
 
 
 # ---- State ----
 class AgentState(TypedDict):
     messages: list
+    summary: NotRequired[str]     # rolling summary of turns no longer in messages
+    route: NotRequired[str]       # "direct" (no tools bound) or "tools", set by the router
+    deadline: NotRequired[float]  # time.monotonic() by which this turn's tools must finish
 
 
-# ---- LLM Node ----
-def llm_node(state: AgentState):
+# ---- Tool Binding Cache ----
+# Binding tools serializes every tool schema and builds a new runnable, so it is
+# done once per tool-registry version instead of on every pass through the LLM node.
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+_binding = {
+    "version": None, "llm": None, "prefill_llm": None,
+    "schemas": None, "schema_tokens": 0, "tools_by_name": None,
+}
+_binding_lock = threading.Lock()
+
+
+def get_tool_binding():
+    """Tool-bound LLM, serialized tool schemas and tool lookup for the current registry"""
+    tools, version = get_tools()
+    
+    with _binding_lock:
+        if _binding["version"] != version:
+            schemas = [convert_to_openai_tool(t) for t in tools]
+            _binding.update(
+                version=version,
+                schemas=schemas,
+                schema_tokens=estimate_tokens(schemas),
+                llm=llm.bind_tools(schemas),
+                prefill_llm=prefill_llm.bind_tools(schemas),
+                tools_by_name={t.name: t for t in tools},
+            )
+        return dict(_binding)
+
+
+# ---- Memory Node ----
+def memory_node(state: AgentState):
+    """Lay out the prompt as: system prompt, rolling summary, history, new turn.
+
+    Every turn of a session renders to the same token prefix plus whatever was
+    appended since, so Ollama can reuse its KV cache instead of re-evaluating
+    the whole prompt; only a background summary fold (see agent.memory)
+    changes the prefix. This stage costs nothing on the critical path.
+    """
     messages = state["messages"]
+    summary = state.get("summary")
     
-    # Add system prompt if not present
-    if not any(isinstance(m, SystemMessage) for m in messages):
-        messages = [SystemMessage(content=SYSTEM_PROMPT)] + messages
+    if not messages or not isinstance(messages[0], SystemMessage):
+        messages = [SYSTEM_MESSAGE] + messages
+    if not summary:
+        return {"messages": messages}
     
-    # Bind tools to LLM
-    llm_with_tools = llm.bind_tools(tools)
-    response = llm_with_tools.invoke(messages)
+    head = 0
+    while head < len(messages) and isinstance(messages[head], SystemMessage):
+        head += 1
+    return {"messages": messages[:head] + [summary_message(summary)] + messages[head:]}
+
+
+# ---- Router Node ----
+# Tool schemas make the prompt several times longer and tempt the model into
+# needless searches, so turns that can't need fresh or looked-up facts go to
+# the LLM with no tools bound. Same system prompt either way.
+_NEEDS_TOOLS = re.compile(
+    r"\b(news|headlines?|latest|recent(ly)?|current(ly)?|today|tonight|yesterday|tomorrow"
+    r"|this (week|month|year)|weather|forecast|temperature|price|stocks?|scores?|results?"
+    r"|search|look (it )?up|google|wikipedia|who (is|was|are|were)|tell me about"
+    r"|when (did|was|is|will)|how (many|much)|population|elections?|released?)\b"
+    r"|\b(19|20)\d\d\b",
+    re.IGNORECASE,
+)
+
+
+def route_query(text):
+    """'tools' if answering might need a search, else 'direct'"""
+    return "tools" if _NEEDS_TOOLS.search(text) else "direct"
+
+
+def router_node(state: AgentState):
+    last = state["messages"][-1]
+    if isinstance(last, HumanMessage) and isinstance(last.content, str):
+        return {"route": route_query(last.content)}
+    return {"route": "tools"}
+
+
+# ---- LLM Node ----
+def _route_llm(state: AgentState):
+    """LLM for this turn's route and the prompt tokens its tool schemas add"""
+    if state.get("route") == "direct":
+        return llm, 0
+    binding = get_tool_binding()
+    return binding["llm"], binding["schema_tokens"]
+
+
+def _prompt_messages(state: AgentState, schema_tokens):
+    # The memory node has already put the system prompt first. Make sure the
+    # prompt (plus injected tool schemas) fits the context window, rather than
+    # letting Ollama silently drop the start of it
+    return trim_to_budget(state["messages"], PROMPT_BUDGET - schema_tokens)
+
+
+def _prompt_tokens(messages, schema_tokens):
+    return sum(message_tokens(m) for m in messages) + schema_tokens
+
+
+def _cancel_event(config):
+    """threading.Event a caller passed as configurable "cancel" to abandon the turn"""
+    return ((config or {}).get("configurable") or {}).get("cancel")
+
+
+def _first_chunk(started):
+    metrics.observe("llm_ttft", time.perf_counter() - started)
+    metrics.mark("first_token")
+
+
+_STREAM_END = object()
+_generating = 0  # real turns generating right now
+_generating_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _generation():
+    """Count a turn's generation while it runs, so prefills don't queue ahead of turns in Ollama"""
+    global _generating
+    with _generating_lock:
+        _generating += 1
+    try:
+        yield
+    finally:
+        with _generating_lock:
+            _generating -= 1
+
+
+def _stream_chunks(route_llm, messages, cancel):
+    """route_llm.stream(messages), abandoned within CANCEL_POLL of cancel being set.
+
+    With a cancel event the stream is read on a worker thread, so the turn
+    can give up even while Ollama is still evaluating the prompt; the worker
+    then drops the connection as soon as the next chunk arrives.
+    """
+    if cancel is None:
+        with contextlib.closing(route_llm.stream(messages)) as stream:
+            yield from stream
+        return
+
+    chunks = queue.Queue()
+
+    def pump():
+        try:
+            with contextlib.closing(route_llm.stream(messages)) as stream:
+                for chunk in stream:
+                    chunks.put(chunk)
+                    if cancel.is_set():
+                        break
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(_STREAM_END)
+
+    # In the caller's context, so graph callbacks still see the tokens
+    threading.Thread(target=metrics.in_context(pump), name="llm-stream", daemon=True).start()
+    while True:
+        try:
+            item = chunks.get(timeout=CANCEL_POLL)
+        except queue.Empty:
+            if cancel.is_set():
+                return
+            continue
+        if item is _STREAM_END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def _astream_chunks(route_llm, messages, cancel):
+    """Async twin of _stream_chunks: a pending read is cancelled, which closes the connection"""
+    stream = route_llm.astream(messages)
+    try:
+        if cancel is None:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        while True:
+            pending = asyncio.ensure_future(anext(stream))
+            while not pending.done():
+                await asyncio.wait({pending}, timeout=CANCEL_POLL)
+                if cancel.is_set() and not pending.done():
+                    pending.cancel()
+                    with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                        await pending
+                    return
+            try:
+                yield pending.result()
+            except StopAsyncIteration:
+                return
+    finally:
+        await stream.aclose()
+
+
+def _finish(response, cancelled):
+    if cancelled:
+        # Keep what was said, but never act on a half-generated tool call
+        print("🛑 Generation cancelled")
+        return AIMessage(content=response.content if response else "")
+    return message_chunk_to_message(response)
+
+
+def llm_node(state: AgentState, config):
+    # Cached tool-bound LLM, or the bare one for direct answers
+    route_llm, schema_tokens = _route_llm(state)
+    messages = _prompt_messages(state, schema_tokens)
+    cancel = _cancel_event(config)
+    
+    if cancel is not None and cancel.is_set():
+        return {"messages": state["messages"] + [_finish(None, True)]}
+    
+    # Stream so tokens reach graph consumers (stream_mode="messages") as they are generated.
+    # Closing the stream on cancel drops the connection, which stops Ollama generating.
+    response = None
+    started = time.perf_counter()
+    stream = _stream_chunks(route_llm, messages, cancel)
+    with _generation(), contextlib.closing(stream):
+        for chunk in stream:
+            if response is None:
+                _first_chunk(started)
+            response = chunk if response is None else response + chunk
+            if cancel is not None and cancel.is_set():
+                break
+    cancelled = cancel is not None and cancel.is_set()
+    response = _finish(response, cancelled)
+    metrics.observe("llm", time.perf_counter() - started, route=state.get("route", "tools"))
+    log_timings(response, _prompt_tokens(messages, schema_tokens), label=f"LLM ({state.get('route', 'tools')})")
+    
+    return {"messages": state["messages"] + [response]}
+
+
+async def allm_node(state: AgentState, config):
+    """Async twin of llm_node, used by app.astream() so no thread is held while generating"""
+    route_llm, schema_tokens = _route_llm(state)
+    messages = _prompt_messages(state, schema_tokens)
+    cancel = _cancel_event(config)
+    
+    if cancel is not None and cancel.is_set():
+        return {"messages": state["messages"] + [_finish(None, True)]}
+    
+    response = None
+    started = time.perf_counter()
+    stream = _astream_chunks(route_llm, messages, cancel)
+    with _generation():
+        try:
+            async for chunk in stream:
+                if response is None:
+                    _first_chunk(started)
+                response = chunk if response is None else response + chunk
+                if cancel is not None and cancel.is_set():
+                    break
+        finally:
+            await stream.aclose()
+    cancelled = cancel is not None and cancel.is_set()
+    response = _finish(response, cancelled)
+    metrics.observe("llm", time.perf_counter() - started, route=state.get("route", "tools"))
+    log_timings(response, _prompt_tokens(messages, schema_tokens), label=f"LLM ({state.get('route', 'tools')})")
     
     return {"messages": state["messages"] + [response]}
 
 
 # ---- Tool Node ----
-tool_node = ToolNode(tools)
+def tool_node(state: AgentState, config):
+    # One deadline for every tool round in this turn
+    deadline = state.get("deadline") or time.monotonic() + TURN_DEADLINE
+    
+    # Run the requested calls concurrently, each with its own timeout (and abandon them on cancel)
+    results = execute_tool_calls(
+        state["messages"][-1].tool_calls,
+        get_tool_binding()["tools_by_name"],
+        deadline,
+        config,
+        _cancel_event(config),
+    )
+    
+    # Append tool results to the conversation instead of replacing it
+    return {"messages": state["messages"] + results, "deadline": deadline}
 
 
 # ---- Build Graph ----
 graph = StateGraph(AgentState)
 
-graph.add_node("llm", llm_node)
+graph.add_node("memory", memory_node)
+graph.add_node("router", router_node)
+graph.add_node("llm", RunnableLambda(llm_node, afunc=allm_node))
 graph.add_node("tools", tool_node)
 
-graph.set_entry_point("llm")
+graph.set_entry_point("memory")
+graph.add_edge("memory", "router")
+graph.add_edge("router", "llm")
 
 graph.add_conditional_edges(
     "llm",
@@ -47,4 +328,115 @@ graph.add_conditional_edges(
 graph.add_edge("tools", "llm")
 
 # Compile the graph
-app = graph.compile()
\ No newline at end of file
+app = graph.compile()
+
+
+# ---- Warm-up ----
+def warm_up(background=True):
+    """Load the model into Ollama and evaluate the system prompt once per route.
+
+    Sent with the same options (and tools) as a real turn, so the model is not
+    reloaded and the first user turn starts from a cached prompt prefix.
+    """
+    def run():
+        messages = [SYSTEM_MESSAGE, HumanMessage(content="Hello")]
+        for route in ("direct", "tools"):
+            route_llm, schema_tokens = _prefill_llm(route)
+            try:
+                response = route_llm.invoke(messages)
+                log_timings(response, _prompt_tokens(messages, schema_tokens), label=f"LLM warm-up ({route})")
+            except Exception as e:
+                print(f"⚠️  LLM warm-up failed: {e}")
+                return
+    
+    if background:
+        threading.Thread(target=run, daemon=True).start()
+    else:
+        run()
+
+
+def _prefill_llm(route):
+    """One-token LLM for a route and the prompt tokens its tool schemas add"""
+    if route == "direct":
+        return prefill_llm, 0
+    binding = get_tool_binding()
+    return binding["prefill_llm"], binding["schema_tokens"]
+
+
+# ---- Speculative Prefill ----
+_prefilling = set()  # (route, prefix) pairs currently being evaluated
+_prefill_lock = threading.Lock()
+_prefill_slots = threading.BoundedSemaphore(PREFILL_WORKERS)
+
+
+def prefill_routes(history):
+    """Routes worth prefilling for a session's next turn.
+
+    The routes render different system headers, so a prefill only helps the
+    route it went through. With one Ollama slot, warming the other route
+    would evict the cache the next turn needs, so guess the route the last
+    question took; with parallel slots, warm both.
+    """
+    if OLLAMA_PARALLEL > 1:
+        return ("direct", "tools")
+    last = next((m for m in reversed(history) if isinstance(m, HumanMessage)), None)
+    if last is None or not isinstance(last.content, str):
+        return ("tools",)
+    return (route_query(last.content),)
+
+
+def prefill(history, summary="", background=True):
+    """Evaluate a session's prompt prefix while the user is still speaking.
+
+    The next turn's prompt is this prefix (laid out by the memory node) plus
+    the new user message, so when the transcript arrives Ollama finds the
+    prefix in its KV cache and only the new message is evaluated on the
+    critical path. Sent with the same options and keep_alive as a real turn,
+    generating a single token.
+
+    Best effort: returns False without doing anything for an empty history,
+    when every Ollama slot is generating for a turn (the prefill would only
+    delay the next one), or when PREFILL_WORKERS prefills are in flight.
+    """
+    if not SPECULATIVE_PREFILL or not history:
+        return False
+    if _generating >= OLLAMA_PARALLEL:
+        return False
+    if not _prefill_slots.acquire(blocking=False):
+        return False
+
+    if background:
+        threading.Thread(target=_run_prefill, args=(history, summary), name="prefill", daemon=True).start()
+    else:
+        _run_prefill(history, summary)
+    return True
+
+
+def _run_prefill(history, summary):
+    try:
+        laid_out = memory_node({"messages": list(history), "summary": summary})["messages"]
+        for route in prefill_routes(history):
+            _prefill_route(route, laid_out)
+    finally:
+        _prefill_slots.release()
+
+
+def _prefill_route(route, laid_out):
+    route_llm, schema_tokens = _prefill_llm(route)
+    messages = _prompt_messages({"messages": laid_out}, schema_tokens)
+    key = (route, get_tool_binding()["version"], tuple((m.type, str(m.content)) for m in messages))
+    
+    with _prefill_lock:
+        if key in _prefilling:
+            return  # already on its way into the cache
+        _prefilling.add(key)
+    try:
+        started = time.perf_counter()
+        response = route_llm.invoke(messages)
+        metrics.observe("prefill", time.perf_counter() - started, route=route)
+        log_timings(response, _prompt_tokens(messages, schema_tokens), label=f"LLM prefill ({route})")
+    except Exception as e:
+        print(f"⚠️  LLM prefill failed: {e}")
+    finally:
+        with _prefill_lock:
+            _prefilling.discard(key)
\ No newline at end of file
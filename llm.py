@@ -1,14 +1,57 @@
+import os
+
 from langchain_ollama import ChatOllama
 
+# Context window and reply length; prompts are trimmed to fit NUM_CTX - NUM_PREDICT
+NUM_CTX = 2048
+NUM_PREDICT = 256
+KEEP_ALIVE = -1      # keep the model loaded between turns (-1 = forever, or a duration like "30m")
+LOG_TIMINGS = True   # print Ollama's prompt-eval vs. eval timings after every LLM call
+SPECULATIVE_PREFILL = True  # evaluate the conversation so far while the user is still speaking
+PREFILL_WORKERS = 2         # prefills in flight at once; further ones are dropped, not queued
+# Ollama's parallel slots (set OLLAMA_NUM_PARALLEL for both); with more than one, each route keeps its own cache
+OLLAMA_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", "1"))
+
 llm = ChatOllama(
     model="llama3.2:3b",
     temperature=0.6,
-    num_ctx=2048,
-    num_predict=256,
+    num_ctx=NUM_CTX,
+    num_predict=NUM_PREDICT,
     top_p=0.9,
     repeat_penalty=1.15,
+    keep_alive=KEEP_ALIVE,
 )
 
+# Same model options (a different num_ctx would make Ollama reload the model),
+# but stops after one token: used to load the model and fill its prompt cache
+prefill_llm = llm.model_copy(update={"num_predict": 1})
+
+
+def ollama_timings(response):
+    """Token counts and durations (ms) Ollama reported for a response"""
+    meta = response.response_metadata or {}
+    return {
+        "prompt_tokens": meta.get("prompt_eval_count") or 0,
+        "prompt_ms": (meta.get("prompt_eval_duration") or 0) / 1e6,
+        "output_tokens": meta.get("eval_count") or 0,
+        "output_ms": (meta.get("eval_duration") or 0) / 1e6,
+        "load_ms": (meta.get("load_duration") or 0) / 1e6,
+    }
+
+
+def log_timings(response, prompt_tokens=None, label="LLM"):
+    """Print prompt-eval vs. eval timings; few evaluated prompt tokens means the prefix cache was hit"""
+    if not LOG_TIMINGS or not response.response_metadata.get("eval_count"):
+        return  # disabled, or a cancelled/partial response with no stats
+    t = ollama_timings(response)
+    evaluated = f"{t['prompt_tokens']}/~{prompt_tokens}" if prompt_tokens else f"{t['prompt_tokens']}"
+    rate = t["output_tokens"] / (t["output_ms"] / 1000) if t["output_ms"] else 0.0
+    print(
+        f"⏱️  {label}: prompt {evaluated} tok evaluated in {t['prompt_ms']:.0f} ms, "
+        f"{t['output_tokens']} tok generated in {t['output_ms']:.0f} ms ({rate:.0f} tok/s)"
+        + (f", model load {t['load_ms']:.0f} ms" if t["load_ms"] > 50 else "")
+    )
+
 SYSTEM_PROMPT = """You are a helpful, knowledgeable AI assistant speaking through voice.
 
 Rules:
@@ -1,15 +1,35 @@
 import sys
+import threading
 import time
-from langchain_core.messages import HumanMessage, SystemMessage
-from agent.graph import app
-from agent.stt import listen_and_convert
+from langchain_core.messages import HumanMessage
+from agent.streaming import stream_agent_events
+from agent.graph import prefill
+from agent.stt import listen_and_convert, BargeInMonitor
 from agent.tts import speak
-from agent.llm import SYSTEM_PROMPT
+from agent.speech_pipeline import SpeechPipeline
+from agent.sessions import SessionStore
+from agent import metrics
+from agent.warmup import warm_up
 
 # Configuration
 MODE = "voice"  # Change to "text" for text-only mode
 MAX_RETRIES = 3
 SILENCE_TIMEOUT = 2  # seconds
+SESSION_ID = "local"
+
+# Phrases spoken over and over; synthesized once at startup and served from the TTS cache
+WELCOME_MSG = "Hello! I'm your AI assistant. How can I help you today?"
+GOODBYE_MSG = "Goodbye! Have a great day!"
+FIXED_PROMPTS = [
+    WELCOME_MSG,
+    GOODBYE_MSG,
+    "Goodbye",
+    "I didn't catch that. Please try again.",
+    "I'm having trouble hearing you. Let's switch to text mode.",
+    "Conversation cleared",
+    "Switching to voice mode",
+    "Switching to text mode",
+]
 
 
 def print_banner():
@@ -30,12 +50,13 @@ def print_banner():
     print("=" * 60)
 
 
-def get_user_input(mode="voice"):
-    """Get user input via voice or text"""
+def get_user_input(mode="voice", barge_in=None):
+    """Get user input via voice or text (continuing an interruption if barge_in is given)"""
     if mode == "voice":
         retries = 0
         while retries < MAX_RETRIES:
-            transcript = listen_and_convert()
+            transcript = listen_and_convert(barge_in)
+            barge_in = None
             
             if transcript:
                 print(f"\n📝 You said: {transcript}")
@@ -45,19 +66,24 @@ def get_user_input(mode="voice"):
             if retries < MAX_RETRIES:
                 print(f"⚠️  Didn't catch that. Try again ({retries}/{MAX_RETRIES})")
                 speak("I didn't catch that. Please try again.")
-                time.sleep(0.5)
         
         print("❌ Max retries reached. Switching to text mode.")
         speak("I'm having trouble hearing you. Let's switch to text mode.")
         return None
     
     else:  # text mode
+        if barge_in:
+            barge_in.mic.close()
         user_input = input("\n💬 You: ").strip()
+        metrics.end_of_speech()
         return user_input if user_input else None
 
 
-def stream_agent_response(query, conversation_history):
-    """Stream agent response and return full text"""
+def stream_agent_response(query, conversation_history, summary="", speech=None, cancel=None):
+    """Stream agent response and return full text (spoken sentence by sentence if speech is given).
+
+    Setting cancel stops generation; the text produced so far is returned.
+    """
     print("\n🤖 Agent: ", end="", flush=True)
     
     full_response = ""
@@ -66,27 +92,23 @@ def stream_agent_response(query, conversation_history):
         # Prepare messages with conversation history
         messages = conversation_history + [HumanMessage(content=query)]
         
-        # Stream response
-        for event in app.stream(
-            {"messages": messages},
-            stream_mode="values"
-        ):
-            if event["messages"]:
-                last_msg = event["messages"][-1]
-                
-                # Only process AI messages
-                if hasattr(last_msg, 'content') and last_msg.content:
-                    new_content = last_msg.content
-                    
-                    # Print incremental content
-                    if new_content != full_response:
-                        if new_content.startswith(full_response):
-                            delta = new_content[len(full_response):]
-                            print(delta, end="", flush=True)
-                        else:
-                            print(new_content, end="", flush=True)
-                        
-                        full_response = new_content
+        # Stream tokens as the LLM produces them
+        for event in stream_agent_events(messages, summary, cancel):
+            if event["type"] == "token":
+                print(event["text"], end="", flush=True)
+                if speech:
+                    speech.feed(event["text"])
+            
+            elif event["type"] == "tool_call":
+                print(f"\n🔧 Using {event['name']}...", flush=True)
+            
+            elif event["type"] == "tool_result":
+                print(f"✅ {event['name']} finished\n🤖 Agent: ", end="", flush=True)
+            
+            elif event["type"] == "done":
+                full_response = event["full"]
+                if event.get("cancelled"):
+                    print(" [interrupted]", end="")
         
         print()  # Newline after response
         return full_response
@@ -94,6 +116,8 @@ def stream_agent_response(query, conversation_history):
     except Exception as e:
         error_msg = f"Sorry, I encountered an error: {str(e)}"
         print(f"\n❌ {error_msg}")
+        if speech:
+            speech.say(error_msg)
         return error_msg
 
 
@@ -118,64 +142,94 @@ def handle_special_commands(user_input, mode):
     return None, mode
 
 
+def start_barge_in_monitor(speech, cancel):
+    """Listen during the reply; if the user talks, stop speaking and generating at once"""
+    def interrupt():
+        cancel.set()
+        speech.cancel()
+    
+    try:
+        return BargeInMonitor(on_barge_in=interrupt).start()
+    except Exception as e:
+        print(f"⚠️  Barge-in unavailable: {e}")
+        return None
+
+
 def main():
     """Main application loop"""
     global MODE
     
     print_banner()
     
-    # Initialize conversation history
-    conversation_history = [SystemMessage(content=SYSTEM_PROMPT)]
+    # Load the model, search clients and (for voice) speech services and the sound
+    # device, and cache fixed prompts, while the user reads the banner
+    voice = MODE == "voice"
+    warm_up(speech=voice, phrases=FIXED_PROMPTS if voice else (), local_audio=voice)
+    
+    # Conversation history and rolling summary (a local session never expires)
+    conversations = SessionStore(ttl=None)
     
     # Welcome message
-    welcome_msg = "Hello! I'm your AI assistant. How can I help you today?"
+    welcome_msg = WELCOME_MSG
     print(f"\n🤖 Agent: {welcome_msg}\n")
     if MODE == "voice":
         speak(welcome_msg)
     
+    # Set when the user interrupted the last reply; capture continues from there
+    barge_in = None
+    
     # Main loop
     while True:
         try:
-            # Get user input
-            user_input = get_user_input(MODE)
+            # A turn is timed from the end of the user's speech; no input or a command doesn't count
+            with metrics.turn(SESSION_ID) as turn:
+                # Let Ollama evaluate the conversation so far while the user speaks (or types)
+                session = conversations.get(SESSION_ID)
+                prefill(session.history, session.summary)
             
-            if not user_input:
-                continue
+                # Get user input
+                user_input = get_user_input(MODE, barge_in)
+                barge_in = None
             
-            # Handle special commands
-            command, MODE = handle_special_commands(user_input, MODE)
+                if not user_input:
+                    turn.abandon()
+                    continue
             
-            if command == "exit":
-                goodbye_msg = "Goodbye! Have a great day!"
-                print(f"\n👋 {goodbye_msg}")
-                speak(goodbye_msg)
-                break
+                # Handle special commands
+                command, MODE = handle_special_commands(user_input, MODE)
+                if command:
+                    turn.abandon()
             
-            elif command == "switch":
-                continue
+                if command == "exit":
+                    goodbye_msg = GOODBYE_MSG
+                    print(f"\n👋 {goodbye_msg}")
+                    speak(goodbye_msg)
+                    break
             
-            elif command == "clear":
-                conversation_history = [SystemMessage(content=SYSTEM_PROMPT)]
-                continue
+                elif command == "switch":
+                    continue
             
-            # Get agent response
-            response = stream_agent_response(user_input, conversation_history)
+                elif command == "clear":
+                    conversations.clear(SESSION_ID)
+                    continue
             
-            if response:
-                # Update conversation history (keep last 10 messages)
-                conversation_history.append(HumanMessage(content=user_input))
-                conversation_history.append(SystemMessage(content=response))
-                
-                # Keep history manageable
-                if len(conversation_history) > 21:  # System prompt + 10 exchanges
-                    conversation_history = [conversation_history[0]] + conversation_history[-20:]
-                
-                # Speak response in voice mode
-                if MODE == "voice":
-                    speak(response)
+                # Get agent response (voice mode starts speaking on the first sentence
+                # and keeps listening, so the user can interrupt)
+                cancel = threading.Event()
+                speech = SpeechPipeline() if MODE == "voice" else None
+                monitor = start_barge_in_monitor(speech, cancel) if speech else None
+                session = conversations.get(SESSION_ID)
+                response = stream_agent_response(user_input, session.history, session.summary, speech, cancel)
             
-            # Small delay between turns
-            time.sleep(0.3)
+                if response:
+                    # Update conversation history (older turns get summarized in the background)
+                    conversations.save_exchange(SESSION_ID, user_input, response)
+                
+                # Wait for the remaining queued sentences to finish playing (returns at once if interrupted)
+                if speech:
+                    speech.close()
+                if monitor:
+                    barge_in = monitor.stop()
         
         except KeyboardInterrupt:
             print("\n\n⚠️  Interrupted. Exiting...")
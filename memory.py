@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
+
+from agent.llm import llm
+from agent.tokens import HISTORY_BUDGET, message_tokens, truncate_to_tokens
+
+# Configuration
+SUMMARY_TRIGGER = HISTORY_BUDGET // 2      # fold old turns once stored history passes this many tokens
+KEEP_RECENT_TOKENS = HISTORY_BUDGET // 4   # the newest turns always stay verbatim
+SUMMARY_MAX_TOKENS = 200
+LINE_MAX_TOKENS = 150                      # per message in the transcript given to the summarizer
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARIZER_PROMPT = """You maintain a running summary of a conversation between a user and a voice assistant.
+
+Merge the new conversation lines into the current summary.
+- Keep names, facts, preferences, decisions and open questions
+- Drop greetings and small talk
+- Write plain sentences, at most 120 words
+- Reply with the updated summary only"""
+
+# One background worker: summaries are cheap to delay and shouldn't compete with live turns
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+
+
+def summary_message(summary):
+    """The message carrying the rolling summary, placed right after the system prompt"""
+    return SystemMessage(content=SUMMARY_PREFIX + summary)
+
+
+def history_tokens(history):
+    return sum(message_tokens(m) for m in history)
+
+
+def select_for_folding(history):
+    """Oldest turns to fold into the summary, leaving the newest KEEP_RECENT_TOKENS verbatim"""
+    start = 0
+    while start < len(history) and isinstance(history[start], SystemMessage):
+        start += 1
+
+    # Walk back from the newest message until the verbatim budget is used up
+    cut = len(history)
+    kept = 0
+    while cut > start and kept + message_tokens(history[cut - 1]) <= KEEP_RECENT_TOKENS:
+        cut -= 1
+        kept += message_tokens(history[cut])
+
+    # Always keep the last exchange, and start the kept part on a user turn
+    last_user = max((i for i in range(start, len(history)) if isinstance(history[i], HumanMessage)), default=start)
+    cut = min(cut, last_user)
+    while cut < last_user and not isinstance(history[cut], HumanMessage):
+        cut += 1
+
+    return history[start:cut]
+
+
+def _transcript(messages):
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            role = "User"
+        elif isinstance(message, AIMessage):
+            if not message.content:
+                continue  # tool-call requests; their results follow
+            role = "Assistant"
+        elif isinstance(message, ToolMessage):
+            role = "Tool result"
+        else:
+            continue
+        lines.append(f"{role}: {truncate_to_tokens(str(message.content), LINE_MAX_TOKENS)}")
+    return "\n".join(lines)
+
+
+def summarize(summary, messages):
+    """Fold messages into the existing summary with one LLM call"""
+    prompt = [
+        SystemMessage(content=SUMMARIZER_PROMPT),
+        HumanMessage(content=(
+            f"Current summary:\n{summary or '(none yet)'}\n\n"
+            f"New conversation lines:\n{_transcript(messages)}"
+        )),
+    ]
+    updated = llm.invoke(prompt).content.strip()
+    return truncate_to_tokens(updated, SUMMARY_MAX_TOKENS)
+
+
+def schedule_compaction(session, apply):
+    """Fold a long session's older turns into its summary on the background worker.
+
+    Returns the future, or None if there is nothing to do. apply(folded, summary)
+    is called with the folded messages and the new summary when it is ready.
+    """
+    if session.compacting or history_tokens(session.history) <= SUMMARY_TRIGGER:
+        return None
+
+    folded = select_for_folding(session.history)
+    if not folded:
+        return None
+
+    session.compacting = True
+    previous = session.summary
+
+    def job():
+        try:
+            apply(folded, summarize(previous, folded))
+        except Exception as e:
+            # The history is still trimmed by token budget, so nothing breaks
+            print(f"⚠️  Summarization failed: {e}")
+        finally:
+            session.compacting = False
+
+    return _worker.submit(job)
@@ -0,0 +1,259 @@
+"""Per-stage latency of voice turns, aggregated into histograms.
+
+Each turn gets an ID (metrics.turn(session_id)), held in a context
+variable so every stage below it can record a span without the ID being
+passed around: capture, stt, graph, llm_ttft, llm, tool, tts,
+tts_first_byte, playback. Turn-relative marks (first_token, first_audio)
+measure what the user actually waits for, from the end of their speech
+(or from the start of a typed turn). Work handed to a thread pool
+keeps its turn when submitted through in_context(). The turn's total
+("turn") is also measured from that origin, so time spent waiting for the
+user to start talking isn't counted.
+
+render() is the Prometheus text served at /api/metrics. With
+METRICS_TRACE_FILE set, every span is also appended there as one JSON line.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import threading
+import time
+import uuid
+
+from config import METRICS_TRACE_FILE
+
+# Configuration
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+METRIC_PREFIX = "assistant"
+
+_current_turn = contextvars.ContextVar("turn", default=None)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count for one series"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None if empty)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    """Stage histograms keyed by stage name plus extra labels"""
+
+    def __init__(self, trace_file=METRICS_TRACE_FILE):
+        self._histograms = {}  # (stage, sorted label items) -> Histogram
+        self._lock = threading.Lock()
+        self._trace_file = trace_file
+        self._trace = None
+        self._trace_lock = threading.Lock()  # file I/O stays off the histogram lock
+
+    def observe(self, stage, seconds, turn=None, **labels):
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+        if self._trace_file:
+            self._write_trace(stage, seconds, turn, labels)
+
+    def snapshot(self):
+        """{(stage, labels): (count, p50, p99)} for reports"""
+        with self._lock:
+            return {
+                key: (h.count, h.quantile(0.5), h.quantile(0.99))
+                for key, h in self._histograms.items()
+            }
+
+    def render(self):
+        """Stage histograms and cache counters in Prometheus text format"""
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each stage of a voice turn",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for (stage, labels), h in sorted(self._histograms.items()):
+                base = _labels((("stage", stage),) + labels)
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{{base},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{base}}} {h.sum:.6f}")
+                lines.append(f"{name}_count{{{base}}} {h.count}")
+
+        lines.extend(_cache_lines())
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def _write_trace(self, stage, seconds, turn, labels):
+        line = json.dumps({
+            "ts": round(time.time(), 3),
+            "turn_id": turn.id if turn else None,
+            "session_id": turn.session_id if turn else None,
+            "stage": stage,
+            "ms": round(seconds * 1000, 2),
+            **labels,
+        }) + "\n"
+        with self._trace_lock:
+            if self._trace is None:
+                self._trace = open(self._trace_file, "a", encoding="utf-8", buffering=1)
+            self._trace.write(line)
+
+
+registry = Registry()
+
+
+class Turn:
+    """One user turn: an ID plus the time it started"""
+
+    def __init__(self, session_id=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.origin = self.started  # marks (and the turn's total) are measured from here
+        self.abandoned = False
+        self._marked = set()
+        self._lock = threading.Lock()
+
+    def abandon(self):
+        """Not a turn after all (no input, or a command): its total isn't recorded"""
+        self.abandoned = True
+
+    def mark(self, stage):
+        """Record time since the turn's origin, the first time stage is reached"""
+        with self._lock:
+            if stage in self._marked:
+                return
+            self._marked.add(stage)
+        registry.observe(stage, time.perf_counter() - self.origin, self)
+
+
+@contextlib.contextmanager
+def turn(session_id=None):
+    """Run a turn: stages recorded inside it carry its ID; its time from the origin is the "turn" stage"""
+    current = Turn(session_id)
+    token = _current_turn.set(current)
+    try:
+        yield current
+    finally:
+        if not current.abandoned:
+            registry.observe("turn", time.perf_counter() - current.origin, current)
+        try:
+            _current_turn.reset(token)
+        except ValueError:
+            pass  # a streaming response closed from another context
+
+
+def current_turn():
+    return _current_turn.get()
+
+
+@contextlib.contextmanager
+def span(stage, **labels):
+    """Time a block as one stage of the current turn"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(stage, time.perf_counter() - started, _current_turn.get(), **labels)
+
+
+def observe(stage, seconds, **labels):
+    """Record a duration measured elsewhere as one stage of the current turn"""
+    registry.observe(stage, seconds, _current_turn.get(), **labels)
+
+
+def end_of_speech():
+    """The user just stopped talking: later marks measure the wait from this moment"""
+    current = _current_turn.get()
+    if current is not None:
+        current.origin = time.perf_counter()
+
+
+def mark(stage):
+    """Record time since the current turn's origin, once per turn (no-op outside a turn)"""
+    current = _current_turn.get()
+    if current is not None:
+        current.mark(stage)
+
+
+def in_context(fn):
+    """Wrap fn to run in the caller's context, so pool threads record spans to the right turn"""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+def render():
+    return registry.render()
+
+
+def _labels(items):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Cache statistics that only ever go up are exported as counters, the rest as gauges
+_COUNTER_STATS = {
+    "hits", "misses", "coalesced", "evictions", "expirations", "bypassed", "stores",
+    "memory_hits", "disk_hits",
+}
+
+
+def _cache_stats():
+    # Imported here so rendering doesn't decide what the server loads at startup
+    from agent.tools import tool_cache_stats
+    from agent.tts_cache import audio_cache
+    from agent.response_cache import response_cache
+    from agent.sessions import sessions
+
+    stats = dict(tool_cache_stats())
+    stats["audio"] = audio_cache.stats()
+    stats["response"] = response_cache.stats()
+    return stats, len(sessions)
+
+
+def _cache_lines():
+    stats, live_sessions = _cache_stats()
+    series = {}
+    for cache, values in sorted(stats.items()):
+        for key, value in values.items():
+            series.setdefault(key, []).append((cache, value))
+
+    lines = []
+    for key, values in sorted(series.items()):
+        counter = key in _COUNTER_STATS
+        name = f"{METRIC_PREFIX}_cache_{key}" + ("_total" if counter else "")
+        lines.append(f"# TYPE {name} {'counter' if counter else 'gauge'}")
+        lines.extend(f'{name}{{cache="{_escape(cache)}"}} {value}' for cache, value in values)
+
+    lines.append(f"# TYPE {METRIC_PREFIX}_sessions gauge")
+    lines.append(f"{METRIC_PREFIX}_sessions {live_sessions}")
+    return lines
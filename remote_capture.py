@@ -0,0 +1,108 @@
+"""Speech captured in the browser and sent to the server for transcription.
+
+The web UI streams 16-bit PCM over a WebSocket (asgi_app /ws/listen), where
+UtteranceStream endpoints and recognizes it exactly like the local
+microphone path, or
+uploads a finished recording to /api/transcribe. Either way no server
+sound card is involved, so one server can listen to many remote users.
+"""
+import numpy as np
+
+from agent.audio import decode_audio
+from agent.backends import get_recognizer
+from agent.vad import FRAME_MS, START_TIMEOUT, MAX_UTTERANCE, UtteranceRecorder
+from agent import metrics
+
+# Configuration
+MIN_RATE = 8000
+MAX_RATE = 96000
+MAX_UPLOAD_SECONDS = START_TIMEOUT + MAX_UTTERANCE  # bounds memory per request
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+
+
+def check_rate(rate):
+    """Validate a client-supplied sample rate"""
+    rate = int(rate)
+    if not MIN_RATE <= rate <= MAX_RATE:
+        raise ValueError(f"sample rate must be between {MIN_RATE} and {MAX_RATE}")
+    return rate
+
+
+class UtteranceStream:
+    """Endpoint int16 PCM that arrives in arbitrarily sized byte chunks.
+
+    The utterance is recognized as it arrives (interim transcripts go to
+    on_result as (text, final)), so transcribe() only waits for the last words.
+    """
+
+    def __init__(self, rate, on_result=None):
+        self.rate = check_rate(rate)
+        self.frame_bytes = 2 * int(self.rate * FRAME_MS / 1000)
+        self.recorder = UtteranceRecorder()
+        self.state = "waiting"
+        self._carry = b""
+        self._fed = 0
+        self._recognition = get_recognizer().open_stream(self.rate, on_result)
+        self._recognizing = True
+
+    def feed(self, data):
+        """Add PCM bytes; returns the states reached, in order (e.g. ["onset", "done"])"""
+        data = self._carry + data
+        usable = len(data) - len(data) % self.frame_bytes
+        self._carry = data[usable:]
+
+        changes = []
+        for start in range(0, usable, self.frame_bytes):
+            frame = np.frombuffer(data[start:start + self.frame_bytes], dtype="<i2").astype(np.int16)
+            state = self.recorder.add(frame)
+            for captured in self.recorder.captured[self._fed:]:
+                self._recognition.feed(captured)
+            self._fed = len(self.recorder.captured)
+            if state != self.state:
+                changes.append(state)
+                self.state = state
+            if state in ("done", "timeout"):
+                break
+        return changes
+
+    @property
+    def finished(self):
+        return self.state in ("done", "timeout")
+
+    def audio(self):
+        """The utterance heard so far (None if speech never started)"""
+        return self.recorder.audio()
+
+    def transcribe(self):
+        """Final transcript of the utterance heard so far, or None"""
+        self._recognizing = False
+        if not self.recorder.captured:
+            self._recognition.cancel()
+            return None
+        with metrics.span("stt"):
+            return self._recognition.finish()
+
+    def close(self):
+        """Abandon recognition if transcribe() was never reached (client went away)"""
+        if self._recognizing:
+            self._recognizing = False
+            self._recognition.cancel()
+
+
+def transcribe(samples, rate):
+    """Transcript for int16 samples, or None if nothing was recognized"""
+    if samples is None or len(samples) == 0:
+        return None
+    with metrics.span("stt"):
+        return get_recognizer().recognize(samples, rate)
+
+
+def transcribe_upload(data, content_type, rate=None):
+    """Decode and transcribe a recording uploaded by the browser"""
+    if rate is not None:
+        rate = check_rate(rate)
+    samples, rate = decode_audio(data, content_type, rate)
+    check_rate(rate)
+    if len(samples) > MAX_UPLOAD_SECONDS * rate:
+        raise ValueError(f"recording longer than {MAX_UPLOAD_SECONDS:.0f}s")
+    return transcribe(samples, rate)
@@ -0,0 +1,208 @@
+import re
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Configuration
+SIMILARITY_THRESHOLD = 0.90  # cosine similarity for a stored query to be considered at all
+RESPONSE_TTL = 6 * 60 * 60   # seconds a cached answer stays valid
+MAX_ENTRIES = 2048
+VECTOR_DIM = 1024            # hashed n-gram features per query
+CHAR_NGRAM = 3
+
+# Queries that depend on the conversation or the clock are never cached
+_CONTEXT_WORDS = {
+    "it", "its", "that", "this", "these", "those", "he", "him", "his", "she", "her", "they",
+    "them", "their", "there", "then", "i", "my", "mine", "we", "us", "our", "above",
+    "again", "else", "more", "another", "same", "previous", "earlier",
+    # ...and ones about the conversation itself
+    "say", "said", "saying", "repeat", "answer", "answered", "reply", "response", "last",
+    "shorter", "longer", "simpler", "conversation", "summarize", "summarise", "summary",
+}
+_FOLLOW_UP_PREFIXES = ("and ", "but ", "so ", "also ", "what about", "how about", "why not")
+_CONVERSATION_PHRASES = ("you just", "you mean", "you think", "think so")
+_TIME_WORDS = {
+    "today", "tonight", "tomorrow", "yesterday", "now", "current", "currently", "latest",
+    "recent", "news", "weather", "forecast", "price", "stock", "score", "time", "date",
+}
+# Words that don't change what is being asked; every other word must match for a hit
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "do", "does", "did", "of",
+    "in", "on", "at", "to", "for", "from", "by", "with", "about", "and", "or", "what", "what's",
+    "whats", "who", "who's", "whos", "how", "please", "can", "could", "would", "tell", "me",
+    "explain", "define", "whom", "which",
+}
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def normalize_query(query):
+    """Lowercased words only, so punctuation and spacing don't change the embedding"""
+    return " ".join(_WORD.findall(query.lower()))
+
+
+def is_cacheable(query):
+    """Standalone, time-independent questions only; follow-ups go to the agent"""
+    normalized = normalize_query(query)
+    words = normalized.split()
+    if len(words) < 3 or normalized.startswith(_FOLLOW_UP_PREFIXES):
+        return False
+    if any(f" {phrase} " in f" {normalized} " for phrase in _CONVERSATION_PHRASES):
+        return False
+    return not any(w in _CONTEXT_WORDS or w in _TIME_WORDS for w in words)
+
+
+def content_words(query):
+    """The words that carry the question, in order, with plural -s dropped"""
+    words = []
+    for word in normalize_query(query).split():
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def same_question(a, b):
+    # Similar n-grams only nominate a candidate: "first"/"second" or "virus and a
+    # bacterium"/"virus and a fungus" score above the threshold but ask something
+    # else, so the content words must agree too (order included, "2 minus 3")
+    return content_words(a) == content_words(b)
+
+
+def embed(query, dim=VECTOR_DIM):
+    """Unit-length hashed bag of words and character n-grams"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in normalize_query(query).split():
+        padded = f" {word} "
+        grams = [word] + [padded[i:i + CHAR_NGRAM] for i in range(len(padded) - CHAR_NGRAM + 1)]
+        for gram in grams:
+            h = zlib.crc32(gram.encode("utf-8"))
+            # The sign bit keeps unrelated collisions from adding up
+            vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ResponseCache:
+    """In-memory vector index of answered questions.
+
+    Each entry is a query embedding in one row of a fixed-size matrix, so a
+    lookup is one matrix-vector product. Entries expire after ttl seconds and
+    the least recently used row is reused once the index is full.
+    """
+
+    def __init__(self, maxsize=MAX_ENTRIES, ttl=RESPONSE_TTL, threshold=SIMILARITY_THRESHOLD, dim=VECTOR_DIM):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.dim = dim
+        self._vectors = np.zeros((maxsize, dim), dtype=np.float32)
+        self._entries = [None] * maxsize     # row -> (query, answer, expires_at)
+        self._last_used = np.zeros(maxsize)  # row -> monotonic time, 0 = free
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+
+    def lookup(self, query):
+        """Cached answer for a near-duplicate of query, or None"""
+        if not is_cacheable(query):
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return None
+
+        vector = embed(query, self.dim)
+        now = time.monotonic()
+        with self._lock:
+            scores = self._vectors @ vector
+            row = int(np.argmax(scores))
+            entry = self._entries[row]
+
+            if entry is not None and entry[2] < now:
+                self._free(row)
+                entry = None
+
+            if entry is None or scores[row] < self.threshold or not same_question(query, entry[0]):
+                self._stats["misses"] += 1
+                return None
+
+            self._last_used[row] = now
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def store(self, query, answer):
+        """Remember the answer to a standalone question"""
+        if not answer or not is_cacheable(query):
+            return
+
+        vector = embed(query, self.dim)
+        now = time.monotonic()
+        with self._lock:
+            # Replace a near-duplicate in place, else take the least recently used row
+            scores = self._vectors @ vector
+            row = int(np.argmax(scores))
+            entry = self._entries[row]
+            if entry is None or scores[row] < self.threshold or not same_question(query, entry[0]):
+                row = int(np.argmin(self._last_used))
+
+            self._vectors[row] = vector
+            self._entries[row] = (query, answer, now + self.ttl)
+            self._last_used[row] = now
+            self._stats["stores"] += 1
+
+    def clear(self):
+        with self._lock:
+            for row in range(self.maxsize):
+                self._free(row)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = sum(entry is not None for entry in self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    # Expects self._lock to be held
+    def _free(self, row):
+        self._vectors[row] = 0.0
+        self._entries[row] = None
+        self._last_used[row] = 0.0
+
+
+response_cache = ResponseCache()
+
+
+# (stored, asked, should_hit) pairs checked by: python -m agent.response_cache
+SELF_CHECK = (
+    ("who was the first person to walk on the moon", "Who was the first person to walk on the Moon?", True),
+    ("how many legs does a spider have", "How many legs does a spider have, please?", True),
+    ("difference between a virus and a bacterium", "the difference between a virus and a bacterium", True),
+    ("who was the first person to walk on the moon", "who was the second person to walk on the moon", False),
+    ("difference between a virus and a bacterium", "difference between a virus and a fungus", False),
+    ("largest city in north america", "largest city in south america", False),
+    ("what is the capital of brazil", "what is the capital of egypt", False),
+    ("should you eat raw chicken", "should you not eat raw chicken", False),
+    ("what is 2 minus 3", "what is 3 minus 2", False),
+)
+
+
+def self_check(pairs=SELF_CHECK):
+    """Rows of (stored, asked, expected, got) for each pair, each against a fresh cache"""
+    rows = []
+    for stored, asked, expected in pairs:
+        cache = ResponseCache(maxsize=4)
+        cache.store(stored, "answer")
+        rows.append((stored, asked, expected, cache.lookup(asked) is not None))
+    return rows
+
+
+if __name__ == "__main__":
+    failed = 0
+    for stored, asked, expected, got in self_check():
+        failed += got != expected
+        print(f"{'ok  ' if got == expected else 'FAIL'} {'hit ' if got else 'miss'} {asked!r} vs {stored!r}")
+    sys.exit(1 if failed else 0)
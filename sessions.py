@@ -0,0 +1,213 @@
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+
+from agent.llm import SYSTEM_PROMPT
+from agent.tokens import estimate_tokens, trim_to_budget, HISTORY_BUDGET
+from agent.memory import schedule_compaction
+
+# Configuration
+SESSION_TTL = 30 * 60               # seconds of inactivity before a session expires (None: never)
+MAX_SESSIONS = 1000                 # LRU bound on live sessions
+MAX_TOTAL_CHARS = 32 * 1024 * 1024  # global cap on stored conversation text
+
+
+class Session:
+    """Conversation history, rolling summary and speech output for one client"""
+
+    def __init__(self):
+        self.history = [SystemMessage(content=SYSTEM_PROMPT)]
+        self.summary = ""
+        self.speech = None
+        self.audio = None         # AudioStream carrying the session's speech to the browser
+        self.last_access = time.monotonic()
+        self.size = len(SYSTEM_PROMPT)
+        self.epoch = 0            # bumped on clear so a late background summary is dropped
+        self.compacting = False
+
+    def close(self):
+        if self.speech:
+            self.speech.close(wait=False)
+            self.speech = None
+        if self.audio:
+            self.audio.reset()
+
+
+def _history_size(history):
+    return sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in history)
+
+
+class SessionStore:
+    """Sessions with idle expiry, LRU eviction and a global memory cap"""
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS, max_total_chars=MAX_TOTAL_CHARS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_total_chars = max_total_chars
+        self._sessions = OrderedDict()
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, session, now):
+        return self.ttl is not None and now - session.last_access > self.ttl
+
+    def get(self, session_id):
+        """Get (creating if needed) a session and mark it as recently used"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or self._expired(session, time.monotonic()):
+                if session is not None:
+                    self._remove(session_id)
+                session = Session()
+                self._sessions[session_id] = session
+                self._total_chars += session.size
+
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            self._evict(keep=session_id)
+            return session
+
+    def save_exchange(self, session_id, user_input, response):
+        """Append a finished user/assistant exchange, trimmed to the history token budget.
+
+        Once the history grows past the summary trigger, its older turns are
+        folded into the rolling summary in the background.
+        """
+        session = self.get(session_id)
+        with self._lock:
+            history = session.history + [
+                HumanMessage(content=user_input),
+                AIMessage(content=response),
+            ]
+            budget = HISTORY_BUDGET - estimate_tokens(session.summary)
+            self._update(session_id, session, trim_to_budget(history, budget), session.summary)
+
+            epoch = session.epoch
+            schedule_compaction(
+                session,
+                lambda folded, summary: self._fold(session_id, session, epoch, folded, summary),
+            )
+
+    def clear(self, session_id):
+        """Reset a session to just the system prompt"""
+        session = self.get(session_id)
+        with self._lock:
+            session.epoch += 1
+            self._update(session_id, session, [SystemMessage(content=SYSTEM_PROMPT)], "")
+
+    def discard(self, session_id):
+        with self._lock:
+            self._remove(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    # The helpers below expect self._lock to be held
+    def _update(self, session_id, session, history, summary):
+        size = _history_size(history) + len(summary)
+        if self._sessions.get(session_id) is session:
+            self._total_chars += size - session.size
+        session.history = history
+        session.summary = summary
+        session.size = size
+        self._evict(keep=session_id)
+
+    def _fold(self, session_id, session, epoch, folded, summary):
+        """Swap folded messages for the new summary (called from the memory worker)"""
+        with self._lock:
+            if session.epoch != epoch:
+                return
+            folded_ids = {id(m) for m in folded}
+            history = [m for m in session.history if id(m) not in folded_ids]
+            self._update(session_id, session, history, summary)
+
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_chars -= session.size
+            session.close()
+
+    def _evict(self, keep):
+        now = time.monotonic()
+
+        # Expired sessions first (oldest are at the front)
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if oldest_id == keep or not self._expired(oldest, now):
+                break
+            self._remove(oldest_id)
+
+        # Then least recently used, until under both bounds
+        while (
+            len(self._sessions) > self.max_sessions
+            or self._total_chars > self.max_total_chars
+        ) and len(self._sessions) > 1:
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == keep:
+                self._sessions.move_to_end(keep)
+                oldest_id = next(iter(self._sessions))
+            self._remove(oldest_id)
+
+
+# Per-session state shared by the Flask and ASGI servers
+sessions = SessionStore()
+
+
+def get_conversation_history(session_id):
+    """Get or create conversation history for a session"""
+    return sessions.get(session_id).history
+
+
+def get_summary(session_id):
+    """Rolling summary of the session's older turns ("" if none yet)"""
+    return sessions.get(session_id).summary
+
+
+def save_exchange(session_id, user_input, response):
+    """Append a finished user/assistant exchange to a session"""
+    sessions.save_exchange(session_id, user_input, response)
+
+
+def clear_conversation(session_id):
+    """Reset a session to just the system prompt"""
+    sessions.clear(session_id)
+
+
+def get_audio_stream(session_id):
+    """Get or create the stream that carries a session's speech to the browser"""
+    from agent.audio_stream import AudioStream
+
+    session = sessions.get(session_id)
+    if session.audio is None:
+        session.audio = AudioStream()
+    return session.audio
+
+
+def get_speech_pipeline(session_id):
+    """Get or create the sentence-pipelined speech output for a session.
+
+    Synthesized audio goes to the session's AudioStream for playback in the
+    browser, never to the server's speakers. Sessions share one synthesis
+    pool, and a pipeline's player thread only runs while it has something
+    to play, so idle sessions hold no threads.
+    """
+    # Imported here so text-only servers never load the audio stack
+    from agent.speech_pipeline import SpeechPipeline, PLAYER_IDLE_TIMEOUT
+
+    audio = get_audio_stream(session_id)
+    session = sessions.get(session_id)
+    if session.speech is None:
+        session.speech = SpeechPipeline(play_fn=audio.write, shared_pool=True, idle_timeout=PLAYER_IDLE_TIMEOUT)
+    return session.speech
+
+
+def stop_speech(session_id):
+    """Stop a session's speech now: drop queued sentences and end its audio stream"""
+    session = sessions.get(session_id)
+    speech, session.speech = session.speech, None
+    if speech:
+        speech.cancel()
+    if session.audio:
+        session.audio.reset()
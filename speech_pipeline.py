@@ -0,0 +1,234 @@
+import re
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from queue import Empty, Queue
+
+from agent.tts import synthesize_safely, open_output
+from agent import metrics
+
+# Configuration
+MIN_SENTENCE_CHARS = 20  # merge shorter fragments ("Yes.") into the next sentence
+SYNTH_WORKERS = 2        # sentences synthesized ahead of playback
+SHARED_SYNTH_WORKERS = 8 # bounded pool shared by all session pipelines
+PLAYER_IDLE_TIMEOUT = 10 # seconds a session pipeline's player thread outlives its last sentence
+
+_SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "vs.", "etc.", "e.g.", "i.e."}
+_MARKDOWN = re.compile(r'[*_`#]+')
+
+_shared_executor = ThreadPoolExecutor(max_workers=SHARED_SYNTH_WORKERS, thread_name_prefix="tts-synth")
+
+
+class SentenceSegmenter:
+    """Split a stream of LLM tokens into speakable sentences"""
+
+    def __init__(self, min_chars=MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """Add text and return any sentences that are now complete"""
+        self._buffer += text
+        sentences = []
+        start = 0
+
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+
+            # Don't split on abbreviations or very short fragments
+            last_word = candidate.rsplit(None, 1)[-1].lower() if candidate else ""
+            if last_word in _ABBREVIATIONS or len(candidate) < self.min_chars:
+                continue
+
+            sentences.append(candidate)
+            start = match.end()
+
+        self._buffer = self._buffer[start:]
+        return [s for s in (_clean(s) for s in sentences) if s]
+
+    def flush(self):
+        """Return whatever text is left over at the end of the stream"""
+        remaining = _clean(self._buffer)
+        self._buffer = ""
+        return [remaining] if remaining else []
+
+
+def _clean(sentence):
+    """Strip markdown markup that shouldn't be read out loud"""
+    return _MARKDOWN.sub("", sentence).strip()
+
+
+class SpeechPipeline:
+    """Synthesize sentences while the LLM is still generating and play them in order.
+
+    Sentences are submitted to a small synthesis pool as soon as they are
+    complete; a single player thread waits on the results in submission order
+    and writes them to one persistent output stream, so audio plays gaplessly
+    while later sentences are still being generated.
+
+    synthesize_fn(text, cancel) gets the pipeline's cancel event and should
+    give up (returning None) once it is set.
+
+    Long-lived per-session pipelines pass shared_pool=True to synthesize on
+    the process-wide pool instead of their own, and an idle_timeout after
+    which the player thread exits; it is started again by the next sentence.
+    """
+
+    def __init__(self, synthesize_fn=synthesize_safely, play_fn=None, workers=SYNTH_WORKERS,
+                 shared_pool=False, idle_timeout=None):
+        self._synthesize = synthesize_fn
+        self._play = play_fn
+        self._device = None
+        self._segmenter = SentenceSegmenter()
+        self._owns_executor = not shared_pool
+        if shared_pool:
+            self._executor = _shared_executor
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-synth")
+        self._idle_timeout = idle_timeout
+        self._pending = Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._cancel = threading.Event()
+
+        self._player = None
+        if idle_timeout is None:
+            self._start_player()
+
+    def feed(self, text):
+        """Feed streamed LLM text; complete sentences are queued for synthesis"""
+        with self._lock:
+            for sentence in self._segmenter.feed(text):
+                self._submit(sentence)
+
+    def say(self, text):
+        """Queue a complete piece of text, keeping order with streamed sentences"""
+        with self._lock:
+            for sentence in self._segmenter.flush():
+                self._submit(sentence)
+            if text and text.strip():
+                self._submit(text.strip())
+
+    def flush(self):
+        """Queue any trailing partial sentence (end of an LLM turn)"""
+        with self._lock:
+            for sentence in self._segmenter.flush():
+                self._submit(sentence)
+
+    def close(self, wait=True):
+        """Flush, stop accepting text and optionally wait until playback ends"""
+        self.flush()
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending.put(None)
+            player = self._player
+
+        if wait and player:
+            player.join()
+        if self._owns_executor:
+            self._executor.shutdown(wait=wait)
+
+    def cancel(self):
+        """Stop talking now: cut playback, drop queued sentences and abandon in-flight synthesis"""
+        with self._lock:
+            self._cancel.set()
+            self._closed = True
+            while True:
+                try:
+                    item = self._pending.get_nowait()
+                except Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is not None:
+                    item[0].cancel()
+            self._pending.put(None)
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def drain(self, timeout=None):
+        """Block until everything queued so far has been played; False on timeout"""
+        self.flush()
+        played = threading.Event()
+        with self._lock:
+            if self._closed:
+                return True
+            self._pending.put(played)
+            self._start_player()
+        return played.wait(timeout)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _submit(self, sentence):
+        if self._closed:
+            return
+        print(f"🗣️ Queued sentence: {sentence[:60]}")
+        # Synthesis and playback are timed against the turn that produced the sentence
+        output = metrics.in_context(self._output)
+        future = self._executor.submit(metrics.in_context(self._synthesize), sentence, self._cancel)
+        self._pending.put((future, output))
+        self._start_player()
+
+    # Expects self._lock to be held (or the pipeline not yet shared)
+    def _start_player(self):
+        if self._player is None:
+            self._player = threading.Thread(target=self._play_loop, name="tts-player", daemon=True)
+            self._player.start()
+
+    def _next_item(self):
+        """The next queued item, or None once the player has been idle for idle_timeout"""
+        while True:
+            try:
+                return self._pending.get(timeout=self._idle_timeout)
+            except Empty:
+                with self._lock:
+                    # Checked under the lock, so a sentence can't be queued after we decide to exit
+                    if self._pending.empty():
+                        self._close_device()
+                        self._player = None
+                        return None
+
+    def _play_loop(self):
+        try:
+            while True:
+                item = self._next_item()
+                if item is None:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()  # drain() marker
+                    continue
+
+                future, output = item
+                try:
+                    audio = future.result()
+                    if audio and not self._cancel.is_set():
+                        output(audio)
+                except CancelledError:
+                    pass
+                except Exception as e:
+                    print(f"❌ Speech pipeline error: {type(e).__name__}: {e}")
+        finally:
+            self._close_device()
+
+    def _close_device(self):
+        if self._device:
+            self._device.close()
+            self._device = None
+
+    def _output(self, audio):
+        if self._play:
+            # A play_fn returns False when the audio went nowhere
+            if self._play(audio) is not False:
+                metrics.mark("first_audio")
+            return
+
+        # Open the output device on first use and keep it for the whole pipeline
+        if self._device is None:
+            self._device = open_output()
+        metrics.mark("first_audio")
+        with metrics.span("playback"):
+            self._device.play(audio, stop=self._cancel)
@@ -0,0 +1,153 @@
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+
+from config import RESPONSE_CACHE_ENABLED
+from agent.graph import app
+from agent.response_cache import response_cache
+from agent import metrics
+
+STREAM_MODES = ["messages", "updates"]
+
+# Answers built from these tools are too time-sensitive to reuse
+UNCACHEABLE_TOOLS = {"web_search"}
+
+
+class _EventTranslator:
+    """Turns LangGraph (mode, payload) stream items into agent events"""
+
+    def __init__(self):
+        self.full_response = ""
+        self.streamed = ""
+        self.pending_calls = {}
+        self.tools_used = set()
+
+    def translate(self, mode, payload):
+        if mode == "messages":
+            # Token-level chunks from ChatOllama inside the llm node
+            chunk, metadata = payload
+            if (
+                metadata.get("langgraph_node") == "llm"
+                and isinstance(chunk, AIMessageChunk)
+                and chunk.content
+            ):
+                self.streamed += chunk.content
+                yield {"type": "token", "text": chunk.content}
+            return
+
+        # "updates" mode: one entry per finished node
+        for node, update in payload.items():
+            if not update or not update.get("messages"):
+                continue
+
+            if node == "llm":
+                last_msg = update["messages"][-1]
+                if last_msg.tool_calls:
+                    for call in last_msg.tool_calls:
+                        self.pending_calls[call["id"]] = call["name"]
+                        self.tools_used.add(call["name"])
+                        yield {"type": "tool_call", "name": call["name"], "args": call["args"]}
+                else:
+                    self.full_response = last_msg.content
+
+            elif node == "tools":
+                for msg in update["messages"]:
+                    if isinstance(msg, ToolMessage) and msg.tool_call_id in self.pending_calls:
+                        name = self.pending_calls.pop(msg.tool_call_id)
+                        yield {"type": "tool_result", "name": name, "content": msg.content}
+
+
+def _question(messages, summary):
+    """The new user question, if the response cache applies to this turn.
+
+    The cache is shared by every session, so only a conversation's opening
+    question uses it: anything later may lean on what was said before.
+    """
+    if not RESPONSE_CACHE_ENABLED or summary or not messages:
+        return None
+    if any(isinstance(m, (HumanMessage, AIMessage)) for m in messages[:-1]):
+        return None
+    last = messages[-1]
+    if isinstance(last, HumanMessage) and isinstance(last.content, str):
+        return last.content
+    return None
+
+
+def _cached_events(answer):
+    # Replayed as one token, so speech output splits it into the same sentences
+    # as the original stream and finds their audio in the TTS cache
+    yield {"type": "token", "text": answer}
+    yield {"type": "done", "full": answer, "cached": True}
+
+
+def _remember(question, translator):
+    if question and not translator.tools_used & UNCACHEABLE_TOOLS:
+        response_cache.store(question, translator.full_response)
+
+
+def _run_config(cancel):
+    # The LLM and tool nodes check this event while they wait
+    return {"configurable": {"cancel": cancel}} if cancel is not None else None
+
+
+def _cancelled_event(translator):
+    return {"type": "done", "full": translator.streamed, "cached": False, "cancelled": True}
+
+
+def stream_agent_events(messages, summary="", cancel=None):
+    """Run the agent and yield events as soon as they are produced.
+
+    summary is the session's rolling summary of older turns, if any.
+    Repeated standalone questions that open a conversation are answered from
+    the response cache.
+    Setting the cancel event (a threading.Event) abandons the turn: generation
+    stops and the final event carries what had been said so far.
+
+    Event types:
+    - {"type": "token", "text": ...}                 one LLM token/delta
+    - {"type": "tool_call", "name": ..., "args": ...} the LLM requested a tool
+    - {"type": "tool_result", "name": ..., "content": ...}
+    - {"type": "done", "full": ..., "cached": ...}   final answer text ("cancelled": True if abandoned)
+    """
+    question = _question(messages, summary)
+    cached = response_cache.lookup(question) if question else None
+    if cached:
+        metrics.mark("first_token")
+        yield from _cached_events(cached)
+        return
+
+    translator = _EventTranslator()
+
+    state = {"messages": messages, "summary": summary}
+    with metrics.span("graph"):
+        for mode, payload in app.stream(state, _run_config(cancel), stream_mode=STREAM_MODES):
+            if cancel is not None and cancel.is_set():
+                yield _cancelled_event(translator)
+                return
+            yield from translator.translate(mode, payload)
+
+    _remember(question, translator)
+    yield {"type": "done", "full": translator.full_response, "cached": False}
+
+
+async def astream_agent_events(messages, summary="", cancel=None):
+    """Async version of stream_agent_events() for the ASGI server"""
+    question = _question(messages, summary)
+    cached = response_cache.lookup(question) if question else None
+    if cached:
+        metrics.mark("first_token")
+        for event in _cached_events(cached):
+            yield event
+        return
+
+    translator = _EventTranslator()
+
+    state = {"messages": messages, "summary": summary}
+    with metrics.span("graph"):
+        async for mode, payload in app.astream(state, _run_config(cancel), stream_mode=STREAM_MODES):
+            if cancel is not None and cancel.is_set():
+                yield _cancelled_event(translator)
+                return
+            for event in translator.translate(mode, payload):
+                yield event
+
+    _remember(question, translator)
+    yield {"type": "done", "full": translator.full_response, "cached": False}
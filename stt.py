@@ -1,56 +1,244 @@
-import sounddevice as sd
+import queue
+import threading
+from collections import deque
+
 import numpy as np
-from ibm_watson import SpeechToTextV1
-from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
-from config import STT_API_KEY, STT_URL
+from agent.backends import get_recognizer
+from agent.vad import (
+    FRAME_MS, PREROLL, MIN_ENERGY, NOISE_MULTIPLIER, ONSET_FRAMES, frame_energy, UtteranceRecorder,
+)
+from agent.tts import playback_meter
+from agent import metrics
+
+# Capture settings (endpointing settings live in agent.vad)
+CAPTURE_RATE = 44100
+
+# Barge-in (user talking over playback) settings
+ECHO_WINDOW = 0.3             # seconds of playback history compared against the mic (covers device latency)
+ECHO_MARGIN = 2.0             # speech must be this much louder than the expected echo
+INITIAL_ECHO_COUPLING = 1.0   # mic/speaker level ratio assumed until it has been measured
+MIN_ECHO_COUPLING = 0.05
+
+
+class Microphone:
+    """An open capture stream delivering FRAME_MS int16 frames through a queue"""
+
+    def __init__(self):
+        # Imported here so text-only and server use never need PortAudio
+        import sounddevice as sd
+
+        self._frames = queue.Queue()
+        self._stream = sd.InputStream(
+            samplerate=CAPTURE_RATE, channels=1, dtype=np.int16,
+            blocksize=int(CAPTURE_RATE * FRAME_MS / 1000), callback=self._callback,
+        )
+        self._stream.start()
+
+    def _callback(self, indata, frames, time_info, status):
+        # Runs on the audio thread: copy out and return immediately
+        self._frames.put(indata[:, 0].copy())
+
+    def read(self, timeout=None):
+        """Next frame (raises queue.Empty on timeout)"""
+        return self._frames.get(timeout=timeout)
+
+    def close(self):
+        self._stream.stop()
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_microphone_factory = Microphone
+
+
+def set_microphone(factory):
+    """Capture from factory() instead of the sound card (e.g. WAV fixtures in benchmarks).
+
+    The replacement needs Microphone's interface: read(timeout) returning
+    FRAME_MS int16 frames at CAPTURE_RATE, close(), and context management.
+    """
+    global _microphone_factory
+    _microphone_factory = factory
+
+
+def open_microphone():
+    return _microphone_factory()
+
+
+class BargeIn:
+    """Speech detected during playback: the still-open microphone plus the audio heard so far"""
+
+    def __init__(self, mic, lead_in, noise_floor):
+        self.mic = mic
+        self.lead_in = lead_in
+        self.noise_floor = noise_floor
+
+
+class BargeInMonitor:
+    """Watch the microphone while the assistant talks and fire when the user starts speaking.
+
+    The speaker's own voice leaks into the mic, so the speech threshold is
+    raised by the recent playback level times a measured mic/speaker
+    coupling. After firing, the microphone stays open and keeps buffering,
+    so capture continues from the onset without losing audio (take()).
+    """
+
+    def __init__(self, on_barge_in):
+        self._on_barge_in = on_barge_in
+        self._mic = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._result = None
+        self.noise_floor = None
+        self.coupling = INITIAL_ECHO_COUPLING
+
+    def start(self):
+        self._mic = open_microphone()
+        self._thread = threading.Thread(target=self._run, name="barge-in", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop monitoring; returns a BargeIn (caller must close its mic) or None"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._result is None and self._mic:
+            self._mic.close()
+        self._mic = None
+        return self._result
 
-authenticator = IAMAuthenticator(STT_API_KEY)
-stt = SpeechToTextV1(authenticator=authenticator)
-stt.set_service_url(STT_URL)
+    def threshold(self, playback_level):
+        return max(
+            MIN_ENERGY,
+            (self.noise_floor or 0.0) * NOISE_MULTIPLIER,
+            self.coupling * playback_level * ECHO_MARGIN,
+        )
 
-def listen_and_convert():
-    print("🎤 Speak now (clearly)...")
+    def _run(self):
+        preroll = deque(maxlen=max(1, int(PREROLL * 1000 / FRAME_MS)))
+        loud_run = 0
 
-    duration = 5
-    fs = 44100
+        while not self._stop.is_set():
+            try:
+                frame = self._mic.read(timeout=0.1)
+            except queue.Empty:
+                continue
 
-    audio = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype=np.int16)
-    sd.wait()
+            energy = frame_energy(frame)
+            playback_level = playback_meter.level(ECHO_WINDOW)
+            is_loud = energy > self.threshold(playback_level)
+            preroll.append(frame)
 
-    audio_bytes = audio.tobytes()
+            if not is_loud:
+                loud_run = 0
+                if playback_level < MIN_ENERGY:
+                    # Nothing playing: this is background noise
+                    self.noise_floor = energy if self.noise_floor is None else 0.9 * self.noise_floor + 0.1 * energy
+                else:
+                    # Playing and no speech: learn how much of our output the mic picks up
+                    coupling = 0.9 * self.coupling + 0.1 * (energy / playback_level)
+                    self.coupling = max(MIN_ECHO_COUPLING, coupling)
+                continue
+
+            loud_run += 1
+            if loud_run >= ONSET_FRAMES:
+                print("✋ Barge-in: user started speaking")
+                self._result = BargeIn(self._mic, list(preroll), self.noise_floor)
+                self._on_barge_in()
+                return
+
+
+def record_utterance(barge_in=None, recognition=None):
+    """Capture from the microphone until the speaker stops; returns int16 samples or None.
+
+    With a BargeIn, capture continues on its open microphone from the
+    already-detected onset instead of waiting for speech to start. With a
+    RecognitionStream, the utterance is fed to it as it is captured.
+    """
+    if barge_in is None:
+        with open_microphone() as mic:
+            return _record(mic, UtteranceRecorder(), recognition)
 
     try:
-        response = stt.recognize(
-            audio=audio_bytes,
-            content_type="audio/l16; rate=44100; channels=1",
-            # KEY CHANGES FOR INDIAN ENGLISH:
-            model="en-IN_Telephony",  # Indian English model
-            # Alternative models you can try:
-            # model="en-IN_BroadbandModel",  # Higher quality for non-telephony
-            # model="en-GB_BroadbandModel",  # British English (closer to Indian)
-            
-            # Additional helpful parameters:
-            smart_formatting=True,  # Better formatting of numbers, dates, etc.
-            speech_detector_sensitivity=0.5,  # Adjust if too sensitive/not sensitive
-            background_audio_suppression=0.5,  # Reduce background noise
-            inactivity_timeout=5,  # Auto-stop after 5 seconds of silence
-            end_of_phrase_silence_time=0.5  # Faster phrase detection
-        ).get_result()
-
-        print("🔍 Raw STT response:", response)
+        return _record(barge_in.mic, UtteranceRecorder(barge_in.lead_in, barge_in.noise_floor), recognition)
+    finally:
+        barge_in.mic.close()
 
-        # Return None if no speech detected
-        if "results" not in response or len(response["results"]) == 0:
-            print("⚠️ No speech detected.")
+
+def _record(mic, recorder, recognition=None):
+    fed = 0
+    while True:
+        state = recorder.add(mic.read())
+        if recognition is not None:
+            # The preroll joins the utterance at the onset, so feed whatever is new
+            for frame in recorder.captured[fed:]:
+                recognition.feed(frame)
+            fed = len(recorder.captured)
+        if state == "done":
+            return recorder.audio()
+        if state == "timeout":
             return None
 
-        transcript = response["results"][0]["alternatives"][0]["transcript"].strip()
-        
-        
-        # Return None for empty transcripts
+
+class _TranscriptLine:
+    """Interim transcripts rewritten in place on one console line"""
+
+    def __init__(self):
+        self.open = False
+
+    def show(self, text, final):
+        print(f"\r📝 {text}", end="\n" if final else "", flush=True)
+        self.open = not final
+
+    def end(self):
+        if self.open:
+            print()
+            self.open = False
+
+
+def listen_and_convert(barge_in=None):
+    if barge_in is None:
+        print("🎤 Speak now (clearly)...")
+
+    line = _TranscriptLine()
+    try:
+        # Opened before capture so the connection is ready by the time speech starts
+        recognition = get_recognizer().open_stream(CAPTURE_RATE, on_result=line.show)
+    except Exception as e:
+        print(f"❌ STT Error: {e}")
+        return None
+
+    try:
+        with metrics.span("capture"):
+            audio = record_utterance(barge_in, recognition)
+    except BaseException:
+        recognition.cancel()
+        raise
+    metrics.end_of_speech()
+    line.end()
+    if audio is None:
+        recognition.cancel()
+        print("⚠️ No speech detected.")
+        return None
+
+    print(f"🎙️ Captured {len(audio) / CAPTURE_RATE:.1f}s of speech")
+
+    try:
+        # Streaming backends have been recognizing all along; only the last words are left
+        with metrics.span("stt"):
+            transcript = recognition.finish()
+
+        # Return None if no speech detected
         if not transcript:
+            print("⚠️ No speech detected.")
             return None
-            
+
         return transcript
 
     except Exception as e:
@@ -0,0 +1,90 @@
+import json
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agent.llm import NUM_CTX, NUM_PREDICT
+
+# Configuration
+CHARS_PER_TOKEN = 3.5      # conservative average for English with the Llama 3 tokenizer
+MESSAGE_OVERHEAD = 4       # role/header tokens added by the chat template per message
+PROMPT_BUDGET = NUM_CTX - NUM_PREDICT
+TURN_RESERVE = 600         # room kept free in stored history for the new message, tool schemas and results
+HISTORY_BUDGET = PROMPT_BUDGET - TURN_RESERVE
+TRUNCATION_MARKER = " [...] "
+MIN_TRUNCATED_TOKENS = 32  # a cut user message shorter than this isn't worth keeping
+
+
+def estimate_tokens(text):
+    """Fast token estimate for text (errs on the high side)"""
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        text = json.dumps(text)
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def message_tokens(message):
+    """Estimated prompt tokens for one chat message, including tool calls"""
+    tokens = MESSAGE_OVERHEAD + estimate_tokens(message.content)
+    for call in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(call["name"]) + estimate_tokens(call["args"])
+    return tokens
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Shorten text to about max_tokens, keeping its beginning and end"""
+    max_chars = int(max(0, max_tokens - 1) * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    keep = max(0, max_chars - len(TRUNCATION_MARKER))
+    head = keep * 2 // 3
+    return text[:head] + TRUNCATION_MARKER + text[len(text) - (keep - head):]
+
+
+def trim_to_budget(messages, budget=PROMPT_BUDGET):
+    """Keep the leading system messages plus as many of the newest messages as fit in budget.
+
+    The kept history always opens with a user message: one that doesn't fit
+    is truncated when its answer is kept (or it is the newest message), and
+    otherwise the answers and tool results that would be left without it are
+    dropped too. If nothing fits whole, the newest exchange is kept truncated.
+    """
+    head = []
+    for message in messages:
+        if not isinstance(message, SystemMessage):
+            break
+        head.append(message)
+    rest = messages[len(head):]
+
+    remaining = budget - sum(message_tokens(m) for m in head)
+    kept = []
+    for message in reversed(rest):
+        cost = message_tokens(message)
+        if cost > remaining:
+            break
+        kept.append(message)
+        remaining -= cost
+    kept.reverse()
+    cut = len(rest) - len(kept)  # rest[:cut] didn't fit
+
+    room = remaining - MESSAGE_OVERHEAD
+    question = rest[cut - 1] if cut else None
+    opens = bool(kept) and isinstance(kept[0], HumanMessage)
+    # Even a stub beats dropping every kept message along with it
+    stub_only = not any(isinstance(m, HumanMessage) for m in kept)
+    if isinstance(question, HumanMessage) and not opens and (room >= MIN_TRUNCATED_TOKENS or stub_only):
+        content = truncate_to_tokens(question.content, room)
+        kept.insert(0, question.model_copy(update={"content": content}))
+        remaining -= message_tokens(kept[0])
+
+    # An answer or tool result without the message it replies to is invalid
+    while kept and not isinstance(kept[0], HumanMessage):
+        remaining += message_tokens(kept.pop(0))
+
+    if not kept and rest:
+        # Nothing fits whole: keep the newest exchange, each message cut to an equal share
+        start = max((i for i, m in enumerate(rest) if isinstance(m, HumanMessage)), default=len(rest) - 1)
+        share = remaining // (len(rest) - start) - MESSAGE_OVERHEAD
+        kept = [m.model_copy(update={"content": truncate_to_tokens(m.content, share)}) for m in rest[start:]]
+
+    return head + kept
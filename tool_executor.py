@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from langchain_core.messages import ToolMessage
+
+from agent import metrics
+
+# Configuration
+TOOL_WORKERS = 8             # bounded pool shared by all sessions
+DEFAULT_TOOL_TIMEOUT = 8.0   # seconds, per tool call
+TOOL_TIMEOUTS = {
+    "web_search": 6.0,
+    "wikipedia_search": 6.0,
+}
+TURN_DEADLINE = 15.0         # total seconds of tool time allowed in one turn
+CANCEL_POLL = 0.05           # seconds between checks of a turn's cancel event while waiting
+
+_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+
+def timed_out_message(name, seconds):
+    """Marker returned to the LLM in place of a result that didn't arrive in time"""
+    return f"[timed out] {name} did not respond within {seconds:.1f}s. Answer without this result."
+
+
+def cancelled_message(name):
+    """Marker for a call abandoned because the turn was cancelled"""
+    return f"[cancelled] {name} was abandoned because the user interrupted."
+
+
+def _run_tool(tool, args, config):
+    with metrics.span("tool", tool=tool.name):
+        try:
+            return str(tool.invoke(args, config))
+        except Exception as e:
+            return f"{tool.name} failed: {e}"
+
+
+def execute_tool_calls(tool_calls, tools_by_name, deadline=None, config=None, cancel=None):
+    """Run a turn's tool calls concurrently and return one ToolMessage per call, in order.
+
+    Each call is bounded by its per-tool timeout and by the turn deadline
+    (a time.monotonic() value); calls that miss either get a "timed out"
+    marker. Setting cancel (a threading.Event) abandons the calls still
+    running within CANCEL_POLL, with "cancelled" markers. An abandoned tool
+    keeps its worker until it returns, but the turn no longer waits for it.
+    """
+    started = time.monotonic()
+    deadline = deadline if deadline is not None else started + TURN_DEADLINE
+
+    contents = {}  # call index -> result text
+    pending = {}   # future -> (call index, time it must finish by)
+    for i, call in enumerate(tool_calls):
+        tool = tools_by_name.get(call["name"])
+        if tool is None:
+            contents[i] = f"Unknown tool: {call['name']}"
+        else:
+            future = _executor.submit(metrics.in_context(_run_tool), tool, call["args"], config)
+            limit = TOOL_TIMEOUTS.get(call["name"], DEFAULT_TOOL_TIMEOUT)
+            pending[future] = (i, min(started + limit, deadline))
+
+    def abandon(future, content):
+        i, _ = pending.pop(future)
+        future.cancel()  # only helps if it hasn't started yet
+        contents[i] = content
+
+    while pending:
+        if cancel is not None and cancel.is_set():
+            for future, (i, _) in list(pending.items()):
+                abandon(future, cancelled_message(tool_calls[i]["name"]))
+            print("🛑 Tool calls cancelled")
+            break
+
+        now = time.monotonic()
+        for future, (i, finish_by) in list(pending.items()):
+            if now >= finish_by and not future.done():
+                name = tool_calls[i]["name"]
+                abandon(future, timed_out_message(name, now - started))
+                print(f"⏱️ Tool {name} timed out")
+
+        done, _ = wait(pending, timeout=CANCEL_POLL, return_when=FIRST_COMPLETED)
+        for future in done:
+            i, _ = pending.pop(future)
+            contents[i] = future.result()
+
+    return [
+        ToolMessage(content=contents[i], name=call["name"], tool_call_id=call["id"])
+        for i, call in enumerate(tool_calls)
+    ]
@@ -1,39 +1,122 @@
+import re
+import threading
+
 from langchain_core.tools import tool
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
-from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
 
+from agent.cache import TTLCache
 
-# -------- Web Search (DuckDuckGo) --------
-duckduckgo = DuckDuckGoSearchRun()
+# Result cache lifetimes: search results go stale quickly, encyclopedia entries don't
+WEB_SEARCH_TTL = 5 * 60
+WIKIPEDIA_TTL = 24 * 60 * 60
+TOOL_CACHE_SIZE = 512
+
+
+# -------- Tool Registry --------
+# Tools are registered dynamically; the version number lets the graph
+# rebuild its tool-bound LLM only when the set of tools actually changes.
+_registry = {}
+_version = 0
+_registry_lock = threading.Lock()
+
+
+def register_tool(t):
+    """Add (or replace) a tool; usable as a decorator on top of @tool"""
+    global _version
+    with _registry_lock:
+        _registry[t.name] = t
+        _version += 1
+    return t
+
+
+def unregister_tool(name):
+    """Remove a tool by name"""
+    global _version
+    with _registry_lock:
+        if _registry.pop(name, None) is not None:
+            _version += 1
+
+
+def get_tools():
+    """Snapshot of the registered tools and the registry version"""
+    with _registry_lock:
+        return list(_registry.values()), _version
+
+
+# -------- Result Caching --------
+# Identical (normalized) queries are answered from cache, and concurrent
+# identical lookups share a single in-flight request.
+tool_caches = {
+    "web_search": TTLCache(maxsize=TOOL_CACHE_SIZE, ttl=WEB_SEARCH_TTL),
+    "wikipedia_search": TTLCache(maxsize=TOOL_CACHE_SIZE, ttl=WIKIPEDIA_TTL),
+}
+
+
+def normalize_query(query):
+    """Cache key for a query: case-, whitespace- and trailing-punctuation-insensitive"""
+    query = re.sub(r"\s+", " ", query.lower()).strip()
+    return query.strip("?!.,;: ")
+
+
+def tool_cache_stats():
+    """Hit/miss/coalescing counters per tool"""
+    return {name: cache.stats() for name, cache in tool_caches.items()}
 
+
+# -------- Search Clients --------
+# Created on first use: their imports are slow, and a text-only chat that
+# never searches shouldn't pay for them (see agent.warmup to preload).
+def _duckduckgo():
+    from langchain_community.tools import DuckDuckGoSearchRun
+
+    return DuckDuckGoSearchRun()
+
+
+def _wikipedia():
+    from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
+    from langchain_community.utilities.wikipedia import WikipediaAPIWrapper
+
+    return WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=1000))
+
+
+_search_factories = {"web_search": _duckduckgo, "wikipedia_search": _wikipedia}
+_search_clients = {}
+_search_lock = threading.Lock()
+
+
+def get_search_client(name):
+    """The search backend behind a tool, created on first use"""
+    with _search_lock:
+        client = _search_clients.get(name)
+        if client is None:
+            client = _search_clients[name] = _search_factories[name]()
+        return client
+
+
+# -------- Web Search (DuckDuckGo) --------
+@register_tool
 @tool
 def web_search(query: str) -> str:
     """Search the internet for current information. Use for recent events, news, or real-time data."""
     try:
-        result = duckduckgo.run(query)
-        return result[:500]  # Limit output
+        result = tool_caches["web_search"].get_or_compute(
+            normalize_query(query),
+            lambda: get_search_client("web_search").run(query)[:500]  # Limit output
+        )
+        return result
     except Exception as e:
         return f"Search failed: {str(e)}"
 
 
 # -------- Wikipedia Search --------
-wikipedia = WikipediaQueryRun(
-    api_wrapper=WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=1000)
-)
-
+@register_tool
 @tool
 def wikipedia_search(query: str) -> str:
     """Search Wikipedia for factual/historical info. Use for established facts, not current events."""
     try:
-        result = wikipedia.run(query)
-        return result[:800]  # Limit output
+        result = tool_caches["wikipedia_search"].get_or_compute(
+            normalize_query(query),
+            lambda: get_search_client("wikipedia_search").run(query)[:800]  # Limit output
+        )
+        return result
     except Exception as e:
         return f"Wikipedia search failed: {str(e)}"
-
-
-# -------- Tool List --------
-tools = [
-    web_search,
-    wikipedia_search,
-]
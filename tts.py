@@ -1,130 +1,235 @@
-import requests
-import pygame
+import contextlib
+import threading
 import time
-import os
-from config import TTS_API_KEY, TTS_URL
+from collections import deque
 
-# Initialize pygame mixer with better settings
-pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
+import numpy as np
+import requests
+from agent.backends import get_synthesizer
+from agent.tts_cache import audio_cache
+from agent import metrics
 
-def speak(text):
-    """Convert text to speech and play audio"""
-    if not text or not text.strip():
-        print("⚠️ No text provided to speak")
-        return
-    
-    print("🔊 Speaking:", text[:100] + "..." if len(text) > 100 else text)
 
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "audio/wav"
-    }
+def stream_audio(text):
+    """Synthesize text and yield raw PCM chunks as they arrive (cached by text/voice/format)"""
+    synthesizer = get_synthesizer()
+    key = audio_cache.key(text, synthesizer.voice_id, f"l16;rate={synthesizer.sample_rate}")
+
+    cached = audio_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
 
-    auth = ("apikey", TTS_API_KEY)
+    chunks = []
+    started = time.perf_counter()
+    synthesizing = 0.0  # time spent waiting on the synthesizer, not on our consumer (e.g. playback)
+    stream = iter(synthesizer.stream(text))
+    try:
+        while True:
+            pulled = time.perf_counter()
+            chunk = next(stream, None)
+            synthesizing += time.perf_counter() - pulled
+            if chunk is None:
+                break
+            if not chunks:
+                metrics.observe("tts_first_byte", time.perf_counter() - started)
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        metrics.observe("tts", synthesizing)
 
-    params = {
-        "voice": "en-US_AllisonV3Voice"
-    }
+    # Only reached when the whole utterance was received
+    audio_cache.put(key, b"".join(chunks))
 
-    payload = {
-        "text": text
-    }
 
-    audio_file = None
+def warm_up(phrases=(), background=True):
+    """Open TTS connections and pre-synthesize fixed phrases into the audio cache"""
+    if background:
+        threading.Thread(target=warm_up, args=(phrases, False), name="tts-warm-up", daemon=True).start()
+        return
 
     try:
-        # Stop any currently playing audio
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.stop()
-            time.sleep(0.2)
-        
-        # Unload to release file handle
-        try:
-            pygame.mixer.music.unload()
-        except:
-            pass
-        
-        time.sleep(0.1)
-
-        # Make TTS API request
-        print("📡 Requesting audio from TTS API...")
-        response = requests.post(
-            TTS_URL,
-            headers=headers,
-            params=params,
-            auth=auth,
-            json=payload,
-            stream=True,
-            timeout=15
+        get_synthesizer().warm_up()
+        print("🔥 TTS connections warmed up")
+    except Exception as e:
+        print(f"⚠️ TTS warm-up failed: {e}")
+
+    for phrase in phrases:
+        synthesize_safely(phrase)
+    if phrases:
+        print(f"🔥 Cached {len(phrases)} fixed prompts")
+
+
+def synthesize(text, cancel=None):
+    """Synthesize text and return the complete PCM bytes (None if cancel is set midway)"""
+    chunks = []
+    with contextlib.closing(stream_audio(text)) as stream:
+        for chunk in stream:
+            if cancel is not None and cancel.is_set():
+                return None  # closing the stream drops the request; nothing gets cached
+            chunks.append(chunk)
+    audio_bytes = b"".join(chunks)
+
+    if not audio_bytes:
+        print("❌ TTS returned empty audio")
+        return None
+
+    return audio_bytes
+
+
+class PlaybackMeter:
+    """Levels of recently played audio, so barge-in detection can discount our own echo"""
+
+    def __init__(self):
+        self._levels = deque(maxlen=256)  # (monotonic time, RMS)
+        self._lock = threading.Lock()
+
+    def record(self, block):
+        samples = np.frombuffer(block, dtype=np.int16).astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+        with self._lock:
+            self._levels.append((time.monotonic(), rms))
+
+    def level(self, window):
+        """Loudest output RMS over the last window seconds (0 when silent)"""
+        since = time.monotonic() - window
+        with self._lock:
+            return max((rms for t, rms in self._levels if t >= since), default=0.0)
+
+
+playback_meter = PlaybackMeter()
+
+PLAYBACK_BLOCK_MS = 20  # write granularity, which bounds how fast playback can be stopped
+
+
+class AudioPlayer:
+    """A persistent output stream; consecutive play() calls play back-to-back without gaps"""
+
+    def __init__(self, samplerate=None):
+        # Imported here so text-only and server use never need PortAudio
+        import sounddevice as sd
+
+        if samplerate is None:
+            samplerate = get_synthesizer().sample_rate
+        self._stream = sd.RawOutputStream(
+            samplerate=samplerate,
+            channels=1,
+            dtype="int16",
+            latency="low"
         )
+        self._block_bytes = 2 * int(samplerate * PLAYBACK_BLOCK_MS / 1000)
+        self._stream.start()
+
+    def play(self, audio, stop=None):
+        """Play PCM bytes, or an iterable of PCM chunks as they are produced.
+
+        If the stop event gets set, buffered audio is dropped and this returns
+        within about one block; returns False in that case.
+        """
+        if isinstance(audio, (bytes, bytearray)):
+            audio = [audio]
+
+        for chunk in audio:
+            for start in range(0, len(chunk), self._block_bytes):
+                if stop is not None and stop.is_set():
+                    self._stream.abort()
+                    return False
+                block = chunk[start:start + self._block_bytes]
+                playback_meter.record(block)
+                # write() blocks only until the block fits in the device buffer
+                self._stream.write(block)
+        return True
+
+    def close(self):
+        """Let queued audio drain, then release the device"""
+        self._stream.stop()
+        self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
-        if response.status_code != 200:
-            print(f"❌ TTS API Error (Status {response.status_code}):", response.text)
-            return
-
-        # Use unique filename with timestamp
-        audio_file = f"response_{int(time.time() * 1000)}.wav"
-        
-        # Save audio file
-        print(f"💾 Saving audio to {audio_file}...")
-        with open(audio_file, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-        
-        # Verify file was created and has content
-        if not os.path.exists(audio_file):
-            print("❌ Audio file was not created")
-            return
-        
-        file_size = os.path.getsize(audio_file)
-        if file_size == 0:
-            print("❌ Audio file is empty")
-            return
-        
-        print(f"✅ Audio file saved ({file_size} bytes)")
-
-        # Load and play audio
-        print("🎵 Loading audio...")
-        pygame.mixer.music.load(audio_file)
-        
-        print("▶️ Playing audio...")
-        pygame.mixer.music.play()
-
-        # Wait for playback to finish
-        while pygame.mixer.music.get_busy():
-            pygame.time.Clock().tick(10)
-        
+
+_output_factory = AudioPlayer
+
+
+def set_audio_output(factory):
+    """Send playback to factory() instead of the sound card (e.g. a null sink in benchmarks).
+
+    The replacement needs AudioPlayer's interface: play(audio, stop=None),
+    close(), and context management.
+    """
+    global _output_factory
+    _output_factory = factory
+
+
+def open_output():
+    return _output_factory()
+
+
+def _marking_first_audio(audio):
+    if isinstance(audio, (bytes, bytearray)):
+        audio = [audio]
+    for chunk in audio:
+        metrics.mark("first_audio")
+        yield chunk
+
+
+def _device_errors():
+    """Exceptions that mean the sound device failed; sounddevice is only imported once one is raised"""
+    try:
+        import sounddevice as sd
+    except (ImportError, OSError):  # no sounddevice or no PortAudio: opening the output raised that
+        return (ImportError, OSError)
+    return (OSError, sd.PortAudioError)
+
+
+def play_audio(audio):
+    """Play PCM bytes (or a chunk iterator) and block until playback ends"""
+    try:
+        with open_output() as player, metrics.span("playback"):
+            print("▶️ Playing audio...")
+            player.play(_marking_first_audio(audio))
         print("✅ Playback finished")
-        
-        # Unload to release file
-        pygame.mixer.music.unload()
-        time.sleep(0.2)
-            
+    except _device_errors() as e:
+        print(f"❌ Audio Playback Error: {e}")
+
+
+def synthesize_safely(text, cancel=None):
+    """synthesize() that reports errors instead of raising (for background workers)"""
+    try:
+        return synthesize(text, cancel)
+    except requests.Timeout:
+        print("❌ TTS request timed out - check your internet connection")
+    except requests.RequestException as e:
+        print(f"❌ TTS Network Error: {e}")
+    except Exception as e:
+        print(f"❌ Unexpected Error: {type(e).__name__}: {e}")
+    return None
+
+
+def speak(text):
+    """Convert text to speech and play it, starting with the first received chunk"""
+    if not text or not text.strip():
+        print("⚠️ No text provided to speak")
+        return
+
+    print("🔊 Speaking:", text[:100] + "..." if len(text) > 100 else text)
+
+    try:
+        play_audio(stream_audio(text))
     except requests.Timeout:
         print("❌ TTS request timed out - check your internet connection")
     except requests.RequestException as e:
         print(f"❌ TTS Network Error: {e}")
-    except pygame.error as e:
-        print(f"❌ Audio Playback Error: {e}")
-        print("   Check if audio file is valid WAV format")
     except Exception as e:
         print(f"❌ Unexpected Error: {type(e).__name__}: {e}")
-    finally:
-        # Clean up the audio file
-        if audio_file and os.path.exists(audio_file):
-            try:
-                time.sleep(0.1)
-                os.remove(audio_file)
-                print(f"🗑️ Cleaned up {audio_file}")
-            except PermissionError:
-                print(f"⚠️ Could not delete {audio_file} (file in use)")
-            except Exception as e:
-                print(f"⚠️ Cleanup error: {e}")
 
 
 # Test function
 if __name__ == "__main__":
     print("Testing TTS...")
     speak("Hello! This is a test of the text to speech system.")
-    print("Test complete!")
\ No newline at end of file
+    print("Test complete!")
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import config
+
+# Configuration
+TTS_CACHE_DIR = getattr(config, "TTS_CACHE_DIR", ".tts_cache")  # optional in config.py
+MEMORY_CACHE_BYTES = 32 * 1024 * 1024   # in-memory LRU tier
+DISK_CACHE_BYTES = 256 * 1024 * 1024    # on-disk tier (only if TTS_CACHE_DIR is set)
+
+
+class AudioCache:
+    """Content-addressed cache of synthesized audio.
+
+    Keys are hashes of (text, voice, format). Entries live in a bounded
+    in-memory LRU and, optionally, in a directory that is trimmed back to
+    its size budget by evicting the least recently used files.
+    """
+
+    def __init__(self, max_bytes=MEMORY_CACHE_BYTES, disk_dir=TTS_CACHE_DIR, disk_max_bytes=DISK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "evictions": 0}
+        self._dir_ready = False  # the directory is created on the first write
+
+    @staticmethod
+    def key(text, voice, audio_format):
+        """Stable cache key for one synthesis request"""
+        raw = "\x1f".join((text.strip(), voice, audio_format))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Cached audio bytes for key, or None"""
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return audio
+
+        audio = self._read_disk(key)
+        with self._lock:
+            if audio is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+
+        # Promote to the memory tier
+        self._put_memory(key, audio)
+        return audio
+
+    def put(self, key, audio):
+        """Store audio bytes under key in both tiers"""
+        if not audio:
+            return
+        self._put_memory(key, audio)
+        self._write_disk(key, audio)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _put_memory(self, key, audio):
+        if len(audio) > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = audio
+            self._bytes += len(audio)
+
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pcm")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)  # mark as recently used
+            return audio
+        except OSError:
+            return None
+
+    def _write_disk(self, key, audio):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            if not self._dir_ready:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                self._dir_ready = True
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+            self._trim_disk()
+        except OSError as e:
+            print(f"⚠️ TTS cache write failed: {e}")
+
+    def _trim_disk(self):
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith(".pcm"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        # Oldest first
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+audio_cache = AudioCache()
@@ -0,0 +1,97 @@
+from collections import deque
+
+import numpy as np
+
+# Endpointing settings
+FRAME_MS = 30                 # analysis frame size
+START_TIMEOUT = 5.0           # give up if no speech starts within this time
+TRAILING_SILENCE = 0.7        # seconds of silence that end an utterance
+MAX_UTTERANCE = 15.0          # hard cap on utterance length
+PREROLL = 0.3                 # audio kept from before the detected onset
+MIN_ENERGY = 300.0            # absolute RMS floor for speech (int16 scale)
+NOISE_MULTIPLIER = 3.0        # speech must be this much louder than the noise floor
+ONSET_FRAMES = 3              # consecutive loud frames needed to start
+
+
+def frame_energy(frame):
+    """RMS energy of an int16 frame"""
+    samples = frame.astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples)))
+
+
+class Endpointer:
+    """Energy-based voice activity endpointer with an adaptive noise floor"""
+
+    def __init__(self, frame_ms=FRAME_MS, trailing_silence=TRAILING_SILENCE,
+                 max_utterance=MAX_UTTERANCE, start_timeout=START_TIMEOUT):
+        self.silence_frames = int(trailing_silence * 1000 / frame_ms)
+        self.max_frames = int(max_utterance * 1000 / frame_ms)
+        self.timeout_frames = int(start_timeout * 1000 / frame_ms)
+        self.noise_floor = None
+        self.started = False
+        self.loud_run = 0
+        self.quiet_run = 0
+        self.frames = 0
+
+    def threshold(self):
+        return max(MIN_ENERGY, (self.noise_floor or 0.0) * NOISE_MULTIPLIER)
+
+    def process(self, frame):
+        """Feed one frame; returns one of: waiting, onset, speech, done, timeout"""
+        energy = frame_energy(frame)
+        self.frames += 1
+        is_loud = energy > self.threshold()
+
+        if not self.started:
+            # Track background noise while nobody is speaking
+            if self.noise_floor is None:
+                self.noise_floor = energy
+            elif not is_loud:
+                self.noise_floor = 0.9 * self.noise_floor + 0.1 * energy
+
+            self.loud_run = self.loud_run + 1 if is_loud else 0
+            if self.loud_run >= ONSET_FRAMES:
+                self.started = True
+                self.frames = self.loud_run
+                return "onset"
+            if self.frames >= self.timeout_frames:
+                return "timeout"
+            return "waiting"
+
+        self.quiet_run = 0 if is_loud else self.quiet_run + 1
+        if self.quiet_run >= self.silence_frames or self.frames >= self.max_frames:
+            return "done"
+        return "speech"
+
+
+class UtteranceRecorder:
+    """Endpoints a stream of frames and keeps the ones that make up the utterance"""
+
+    def __init__(self, lead_in=None, noise_floor=None):
+        self.endpointer = Endpointer()
+        self.preroll = deque(maxlen=max(1, int(PREROLL * 1000 / FRAME_MS)))
+        self.captured = []
+
+        # Continuing after an onset that was already detected elsewhere (barge-in)
+        if lead_in is not None:
+            self.endpointer.started = True
+            self.endpointer.noise_floor = noise_floor
+            self.endpointer.frames = len(lead_in)
+            self.captured = list(lead_in)
+
+    def add(self, frame):
+        """Feed one int16 frame; returns the endpointer state"""
+        state = self.endpointer.process(frame)
+
+        if state == "waiting":
+            self.preroll.append(frame)
+        elif state == "onset":
+            self.captured.extend(self.preroll)
+            self.captured.append(frame)
+        elif state in ("speech", "done"):
+            self.captured.append(frame)
+        return state
+
+    def audio(self):
+        """The captured utterance as one int16 array (None if speech never started)"""
+        return np.concatenate(self.captured) if self.captured else None
@@ -0,0 +1,106 @@
+"""Start-up warm-up: load what the first turn needs, concurrently and off the main thread.
+
+Heavy subsystems (PortAudio, scipy's resampler, the search clients, the
+Watson clients) are imported on first use, so the banner and the web server
+come up without waiting for them. warm_up() then preloads them in parallel
+while the user reads the banner, so the first turn doesn't pay for them
+either.
+
+Import-time report:  python -m agent.warmup
+"""
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Configuration
+REPORT_MODULES = (
+    "agent.llm",
+    "agent.tools",
+    "agent.graph",
+    "agent.streaming",
+    "agent.backends",
+    "agent.tts",
+    "agent.stt",
+)
+
+
+def _llm():
+    from agent.graph import warm_up
+    warm_up(background=False)
+
+
+def _search_clients():
+    from agent.tools import get_search_client
+    for name in ("web_search", "wikipedia_search"):
+        get_search_client(name)
+
+
+def _tts(phrases):
+    from agent.tts import warm_up
+    warm_up(phrases, background=False)
+
+
+def _recognizer():
+    from agent.backends import get_recognizer
+    get_recognizer().warm_up()
+
+
+def _audio_device():
+    import numpy as np
+    import sounddevice  # noqa: F401  (loads PortAudio)
+    from agent.audio import resample_audio
+    resample_audio(np.zeros(160, dtype=np.int16), 16000, 8000)
+
+
+def _run(name, task):
+    started = time.perf_counter()
+    try:
+        task()
+    except Exception as e:
+        print(f"⚠️  Warm-up of {name} failed: {e}")
+        return name, None
+    return name, time.perf_counter() - started
+
+
+def warm_up(speech=False, phrases=(), local_audio=False, background=True):
+    """Preload the model and search clients, plus Watson speech and the local sound device if asked, in parallel
+
+    phrases: fixed prompts pre-synthesized into the audio cache (with speech)
+    local_audio: this process plays and records through its own sound card
+    """
+    if background:
+        threading.Thread(
+            target=warm_up, args=(speech, phrases, local_audio, False), name="warm-up", daemon=True,
+        ).start()
+        return
+
+    tasks = {"llm": _llm, "search": _search_clients}
+    if speech:
+        tasks.update({"tts": lambda: _tts(phrases), "stt": _recognizer})
+    if local_audio:
+        tasks["audio"] = _audio_device
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="warm-up") as pool:
+        results = list(pool.map(lambda item: _run(*item), tasks.items()))
+
+    timings = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in results if seconds is not None)
+    print(f"🔥 Warm-up finished in {time.perf_counter() - started:.2f}s ({timings})")
+
+
+def import_times(modules=REPORT_MODULES):
+    """Cold import time of each module, each measured in a fresh interpreter"""
+    times = {}
+    for module in modules:
+        code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        times[module] = float(result.stdout) if result.returncode == 0 else None
+    return times
+
+
+if __name__ == "__main__":
+    print(f"{'module':<20} import")
+    for module, seconds in import_times().items():
+        print(f"{module:<20} {'failed' if seconds is None else f'{seconds:.2f}s'}")